@@ -1,13 +1,26 @@
 import os
-import subprocess
+import atexit
 import cv2
-import calendar
+import numpy as np
+from concurrent.futures import TimeoutError as FutureTimeout
+from urllib.parse import quote
 from datetime import datetime, date, timedelta
-from flask import Flask, render_template, request, redirect, url_for, session, flash, Response, send_file, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, Response, jsonify, stream_with_context
 from models import db, Student, Attendance
-from recognize_knn_attendance import recognize_frame
+from frame_pipeline import CameraHub, parse_sources
+from recognition_batcher import DynamicBatcher, BatcherFull, SightingVotes
+from recognize_knn_attendance import model_info, normalize_name, warmup_job
+from attendance_cache import attendance_cache
+from attendance_writer import AttendanceWriter
+from attendance_events import attendance_events
+from upgrade_db import upgrade_engine
+from jobs import job_queue
+import metrics
+from enrollment import enroll_job, rebuild_job
+from notifications import notify_monthly_job
+from reports import month_bounds, daily_status_counts, status_counts
+from exports import attendance_rows, roster_rows, stream_export, MIMETYPES
 from sqlalchemy import text
-from openpyxl import Workbook
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,15 +31,64 @@ os.makedirs(EMBEDDING_DIR, exist_ok=True)
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "super_secret_key"
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(BASE_DIR, "attendance.db")
+# Overridable so benchmarks can run against a scratch database
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
+    "ATTENDANCE_DATABASE_URI", "sqlite:///" + os.path.join(BASE_DIR, "attendance.db"))
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 db.init_app(app)
 
+# Whatever launches the app (python app.py, flask run, gunicorn, tests):
+# create missing tables, then bring older databases up to the current schema
+with app.app_context():
+    db.create_all()
+    upgrade_engine(db.engine)
+
 ADMIN_USERNAME = "admin"
 ADMIN_PASSWORD = "admin123"
 
-STREAMING = False
-_initialized_today = False
+# Camera sources by id: "entrance=0,gate=rtsp://10.0.0.5/stream"
+CAMERA_SOURCES = os.environ.get("CAMERA_SOURCES", "0")
+# Models load on the first stream; set to 1 to load them in the background at startup
+RECOGNITION_WARMUP = os.environ.get("RECOGNITION_WARMUP") == "1"
+# Camera clients send this as X-API-Key to /api/recognize; unset: logged-in sessions only
+RECOGNITION_API_KEY = os.environ.get("RECOGNITION_API_KEY")
+API_MAX_FRAMES = 16           # JPEG frames per /api/recognize request
+API_TIMEOUT = 30.0            # seconds; covers the model warm-up on the first request
+_initialized_day = None
+
+MARK_SECONDS = metrics.histogram("attendance_mark_seconds", "mark_attendance() time per recognized name")
+MARKED = metrics.counter("attendance_marked_total", "Students newly marked Present")
+UNMATCHED = metrics.counter("attendance_unmatched_total", "Recognized names with no matching student")
+
+
+def on_write_failed(student_id):
+    attendance_cache.release(student_id)
+    attendance_events.publish("count", {"count": attendance_cache.present_count()})
+
+
+# Webcam sightings are written in batches by a background flusher
+attendance_writer = AttendanceWriter(app, on_failed=on_write_failed, on_written=attendance_cache.confirm)
+atexit.register(attendance_writer.stop)
+
+
+def on_recognized(name, cam_id=None):
+    with app.app_context():
+        mark_attendance(name, cam_id)
+
+
+# Every camera shares one batched recognition backend
+camera_hub = CameraHub(on_recognized=on_recognized)
+for _cam_id, _source in parse_sources(CAMERA_SOURCES).items():
+    camera_hub.register(_cam_id, _source)
+atexit.register(camera_hub.stop)
+
+# Frames posted to /api/recognize by many clients are analysed in shared batches
+api_batcher = DynamicBatcher()
+# ?mark=1 sightings are confirmed over several frames, like stream tracks
+api_votes = SightingVotes()
+
+if RECOGNITION_WARMUP:
+    job_queue.submit("warmup", warmup_job, key="warmup")
 
 
 # ---------------- LOGIN ----------------
@@ -40,6 +102,22 @@ def login_required(f):
     return decorated
 
 
+def api_key_required(f):
+    """A logged-in session, or the RECOGNITION_API_KEY in the X-API-Key header."""
+    import hmac
+    from functools import wraps
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        key = request.headers.get("X-API-Key")
+        # Compared as bytes: compare_digest raises TypeError on non-ASCII str.
+        # WSGI decodes header values as latin-1, which gives back the raw bytes.
+        if "logged_in" in session or (RECOGNITION_API_KEY and key and hmac.compare_digest(
+                key.encode("latin-1"), RECOGNITION_API_KEY.encode("utf-8"))):
+            return f(*args, **kwargs)
+        return jsonify({"error": "unauthorized"}), 401
+    return decorated
+
+
 # ---------------- LANDING & LOGIN ----------------
 @app.route("/")
 def landing():
@@ -66,64 +144,72 @@ def logout():
 @app.route("/dashboard")
 @login_required
 def dashboard():
-    today = date.today()
-    present_ids = {a.student_id for a in Attendance.query.filter_by(date=today, status="Present").all()}
-    return render_template("dashboard.html", present=present_ids)
+    counts = status_counts(date.today())
+    return render_template("dashboard.html", present_count=counts["present"])
 
 
 # ---------------- INITIALIZE TODAY ----------------
 def initialize_today_attendance():
-    global _initialized_today
-    if _initialized_today:
+    """
+    Insert an Absent row for every student without a row today, as one
+    set-based statement. Idempotent across processes thanks to the unique
+    (student_id, date) index; the in-process guard is keyed by date so a
+    long-running server rolls over at midnight.
+    """
+    global _initialized_day
+    today = date.today()
+    if _initialized_day == today:
         return
 
-    today = date.today()
-    students = Student.query.all()
-    existing = {a.student_id for a in Attendance.query.filter_by(date=today).all()}
-
-    for s in students:
-        if s.id not in existing:
-            record = Attendance(
-                student_id=s.id,
-                date=today,
-                day_of_week=today.strftime("%A"),
-                status="Absent",
-                timestamp=datetime.now(),
-                source="system"
-            )
-            db.session.add(record)
+    sql = text("""
+        INSERT INTO attendance (student_id, date, day_of_week, status, timestamp, source)
+        SELECT s.id, :d, :dow, 'Absent', :ts, 'system'
+        FROM student s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM attendance a WHERE a.student_id = s.id AND a.date = :d
+        )
+        ON CONFLICT (student_id, date) DO NOTHING
+    """)
 
+    db.session.execute(sql, {
+        "d": today.isoformat(),
+        "dow": today.strftime("%A"),
+        "ts": datetime.now().isoformat(sep=" "),
+    })
     db.session.commit()
-    _initialized_today = True
+    _initialized_day = today
 
 
 # ---------------- MARK ATTENDANCE ----------------
-def mark_attendance(student_name):
-    today = date.today()
+@MARK_SECONDS.time()
+def mark_attendance(student_name, cam_id=None):
+    """Mark a recognized student present. Returns True if they were newly marked."""
+    initialize_today_attendance()
 
-    student = Student.query.filter(db.func.lower(Student.full_name) == student_name.lower()).first()
-    if not student:
+    student_id = attendance_cache.lookup(student_name)
+    if student_id is None:
         print("❌ Not found:", student_name)
-        return
+        UNMATCHED.inc()
+        return False
 
-    rec = Attendance.query.filter_by(student_id=student.id, date=today).first()
-
-    if rec:
-        rec.status = "Present"
-        rec.timestamp = datetime.now()
-    else:
-        db.session.add(Attendance(
-            student_id=student.id,
-            date=today,
-            day_of_week=today.strftime("%A"),
-            status="Present",
-            timestamp=datetime.now(),
-            source="webcam"
-        ))
+    # Already marked today -> nothing to do
+    if not attendance_cache.claim(student_id):
+        return False
 
-    db.session.commit()
+    attendance_writer.submit(student_id)
+    MARKED.inc()
     print("🟢 Marked Present:", student_name)
 
+    # Pushed to every open dashboard (/events)
+    attendance_events.publish("present", {
+        "student_id": student_id,
+        "name": normalize_name(student_name),
+        "camera": cam_id,
+        "time": datetime.now().strftime("%H:%M:%S"),
+        "count": attendance_cache.present_count(),
+    })
+    return True
+
 
 # ---------------- ADD STUDENT ----------------
 @app.route("/students/add", methods=["GET", "POST"])
@@ -154,33 +240,14 @@ def add_student():
         )
         db.session.add(s)
         db.session.commit()
+        attendance_cache.invalidate()
 
         # -----------------------------
-        # Generate embeddings using NAME
+        # Embed only this student's images and add them to the index
         # -----------------------------
-        try:
-            subprocess.Popen([
-                "python",
-                os.path.join(BASE_DIR, "generate_embeddings_per_image.py"),
-                "--input", folder,
-                "--out", EMBEDDING_DIR,
-                "--name", full_name   # IMPORTANT
-            ])
-        except Exception as e:
-            print("Embedding error:", e)
+        job = job_queue.submit("enroll", enroll_job, folder, full_name, key=("enroll", folder))
 
-        # -----------------------------
-        # Train KNN on NAME labels
-        # -----------------------------
-        try:
-            subprocess.Popen([
-                "python",
-                os.path.join(BASE_DIR, "train_knn.py")
-            ])
-        except Exception as e:
-            print("KNN training error:", e)
-
-        flash("Student added. Embeddings & KNN training started.")
+        flash(f"Student added. Enrollment queued (job {job.id}).")
         return redirect(url_for("students_list"))
 
     return render_template("add_student.html")
@@ -213,23 +280,41 @@ def update_student(id):
             for img in images:
                 img.save(os.path.join(folder, img.filename))
 
-            # OPTIONAL: retrigger embeddings + KNN
-            subprocess.Popen([
-                "python",
-                os.path.join(BASE_DIR, "generate_embeddings_per_image.py")
-            ])
-            subprocess.Popen([
-                "python",
-                os.path.join(BASE_DIR, "train_knn.py")
-            ])
+            # Embed just the new images of this student
+            job_queue.submit("enroll", enroll_job, folder, student.full_name, key=("enroll", folder))
 
         db.session.commit()
+        attendance_cache.invalidate()
         flash("Student updated successfully")
         return redirect(url_for("students_list"))
 
     return render_template("update_student.html", student=student)
 
 
+# ---------------- BACKGROUND JOBS ----------------
+@app.route("/jobs")
+@login_required
+def jobs_list():
+    return jsonify({"pending": job_queue.depth(), "jobs": [j.to_dict() for j in job_queue.list()]})
+
+
+@app.route("/jobs/<int:job_id>")
+@login_required
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route("/jobs/retrain", methods=["POST"])
+@login_required
+def jobs_retrain():
+    # Coalesced: any number of requests while one is queued share that job
+    job = job_queue.submit("retrain", rebuild_job, key="retrain")
+    return jsonify(job.to_dict()), 202
+
+
 @app.route("/students")
 @login_required
 def students_list():
@@ -247,6 +332,7 @@ def delete_student(id):
     s = Student.query.get_or_404(id)
     db.session.delete(s)
     db.session.commit()
+    attendance_cache.invalidate()
     flash("Student Deleted")
     return redirect(url_for("students_list"))
 
@@ -267,47 +353,147 @@ def webcam():
 @app.route("/start_stream")
 @login_required
 def start_stream():
-    global STREAMING
-    STREAMING = True
+    # Cameras start with their first viewer; nothing to do up front
     return jsonify({"status": "started"})
 
 
 @app.route("/stop_stream")
 @login_required
 def stop_stream():
-    global STREAMING
-    STREAMING = False
+    # ?cam=<id> stops one camera, otherwise all of them
+    camera_hub.stop(request.args.get("cam"))
+    attendance_writer.flush()
     return jsonify({"status": "stopped"})
 
 
-def gen_frames():
-    global STREAMING
-    cap = cv2.VideoCapture(0)
+@app.route("/stream_stats")
+@login_required
+def stream_stats():
+    return jsonify(camera_hub.stats())
 
-    with app.app_context():
-        initialize_today_attendance()
 
-    while STREAMING:
-        success, frame = cap.read()
-        if not success:
-            break
+@app.route("/cameras", methods=["GET", "POST"])
+@login_required
+def cameras():
+    if request.method == "POST":
+        data = request.get_json(silent=True) or request.form
+        cam_id, source = data.get("id"), data.get("source")
+        if not cam_id or source in (None, ""):
+            return jsonify({"error": "id and source are required"}), 400
+        source = str(source)
+        camera_hub.register(cam_id, int(source) if source.isdigit() else source)
+        return jsonify(camera_hub.get(cam_id).stats()), 201
+    return jsonify(camera_hub.stats()["cameras"])
+
 
-        processed, name = recognize_frame(frame)
+@app.route("/cameras/<cam_id>", methods=["DELETE"])
+@login_required
+def delete_camera(cam_id):
+    if not camera_hub.unregister(cam_id):
+        return jsonify({"error": "unknown camera"}), 404
+    return jsonify({"status": "removed"})
 
-        if name:
-            with app.app_context():
-                mark_attendance(name)
 
-        ret, buffer = cv2.imencode('.jpg', processed)
-        yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+@app.route("/model_version")
+@login_required
+def model_version():
+    return jsonify(model_info())
+
 
-    cap.release()
+@app.route("/engine/warmup", methods=["POST"])
+@login_required
+def engine_warmup():
+    # Loads torch, the models and the index on the job worker
+    job = job_queue.submit("warmup", warmup_job, key="warmup")
+    return jsonify(job.to_dict()), 202
+
+
+@app.route("/attendance_writer/stats")
+@login_required
+def attendance_writer_stats():
+    return jsonify(attendance_writer.stats())
+
+
+def gen_frames(camera):
+    with app.app_context():
+        initialize_today_attendance()
+
+    for jpeg in camera.jpeg_frames():
+        yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
 
 
 @app.route("/video_feed")
+@app.route("/video_feed/<cam_id>")
 @login_required
-def video_feed():
-    return Response(gen_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+def video_feed(cam_id=None):
+    camera = camera_hub.get(cam_id if cam_id is not None else camera_hub.default_id)
+    if camera is None:
+        return jsonify({"error": "unknown camera"}), 404
+    return Response(gen_frames(camera), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
+# ---------------- RECOGNITION API ----------------
+def _api_face(face):
+    x1, y1, x2, y2 = face["box"]
+    return {
+        "box": [x1, y1, x2, y2],
+        "name": normalize_name(face["name"]) if face["name"] else None,
+        "distance": round(face["distance"], 4),
+        "confidence": round(face["confidence"], 4),
+    }
+
+
+@app.route("/api/recognize", methods=["POST"])
+@api_key_required
+def api_recognize():
+    """
+    Recognize faces in JPEG frames sent by a camera client, as multipart
+    "frame" files or as a raw image/jpeg body. ?camera=<id> names the client.
+
+    ?mark=1 marks students present once they are confirmed: recognized in
+    CONFIRM_VOTES frames from the same camera within API_VOTE_WINDOW
+    seconds, in this request or earlier ones. "marked" lists the students
+    this request actually marked.
+    """
+    blobs = [f.read() for f in request.files.getlist("frame")]
+    if not blobs and request.mimetype == "image/jpeg":
+        blobs = [request.get_data()]
+    if not blobs:
+        return jsonify({"error": "send JPEG frames as 'frame' files or an image/jpeg body"}), 400
+    if len(blobs) > API_MAX_FRAMES:
+        return jsonify({"error": f"at most {API_MAX_FRAMES} frames per request"}), 400
+
+    frames = [cv2.imdecode(np.frombuffer(blob, np.uint8), cv2.IMREAD_COLOR) for blob in blobs]
+    bad = [i for i, frame in enumerate(frames) if frame is None]
+    if bad:
+        return jsonify({"error": "frames could not be decoded", "frames": bad}), 400
+
+    try:
+        results = api_batcher.recognize(frames, timeout=API_TIMEOUT)
+    except BatcherFull:
+        return jsonify({"error": "recognition queue is full, retry shortly"}), 503, {"Retry-After": "1"}
+    except FutureTimeout:
+        return jsonify({"error": "recognition timed out"}), 504
+
+    names = sorted({name for result in results for name in result["names"]})
+    marked = []
+    if request.args.get("mark") == "1":
+        camera = request.args.get("camera")
+        for name in api_votes.record(camera, [result["names"] for result in results]):
+            if mark_attendance(name, camera):
+                marked.append(normalize_name(name))
+
+    return jsonify({
+        "frames": [{"faces": [_api_face(face) for face in result["faces"]]} for result in results],
+        "names": [normalize_name(name) for name in names],
+        "marked": marked,
+    })
+
+
+@app.route("/api/recognize/stats")
+@login_required
+def api_recognize_stats():
+    return jsonify(api_batcher.stats())
 
 
 # ---------------- TODAY'S ATTENDANCE ----------------
@@ -328,25 +514,55 @@ def submit_today():
     return redirect(url_for("attendance_today"))
 
 
-@app.route("/export_today")
+# ---------------- EXPORTS ----------------
+def _date_arg(name, default):
+    value = request.args.get(name)
+    return date.fromisoformat(value) if value else default
+
+
+def export_response(filename, title, header, rows):
+    """Stream rows to the client as ?format=xlsx (default) or csv."""
+    fmt = request.args.get("format", "xlsx")
+    if fmt not in MIMETYPES:
+        fmt = "xlsx"
+    # stream_with_context: the rows are fetched while the response is sent
+    body = stream_with_context(stream_export(fmt, title, header, rows))
+    return Response(body, mimetype=MIMETYPES[fmt],
+                    headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(f'{filename}.{fmt}')}"})
+
+
+@app.route("/export")
 @login_required
-def export_today():
+def export_range():
+    """
+    Any date range: /export?start=2025-01-06&end=2025-04-30&format=csv
+    Narrow it with &roll_prefix=CE3 (a class) or &student_id=4&student_id=9.
+    """
     today = date.today()
+    try:
+        start = _date_arg("start", today)
+        end = _date_arg("end", start)
+    except ValueError:
+        return jsonify({"error": "dates must be YYYY-MM-DD"}), 400
 
-    wb = Workbook()
-    ws = wb.active
-    ws.append(["Name", "Roll No", "Date", "Day", "Status"])
-
-    students = Student.query.order_by(Student.roll_no).all()
-    records = {r.student_id: r.status for r in Attendance.query.filter_by(date=today).all()}
+    student_ids = request.args.getlist("student_id", type=int)
+    roll_prefix = request.args.get("roll_prefix")
+    rows = attendance_rows(start, end, student_ids, roll_prefix)
 
-    for s in students:
-        ws.append([s.full_name, s.roll_no, str(today), today.strftime("%A"), records.get(s.id, "Absent")])
+    name = f"attendance_{start}_{end}" + (f"_{roll_prefix}" if roll_prefix else "")
+    return export_response(name, f"Attendance {start} - {end}",
+                           ["Date", "Day", "Name", "Roll No", "Status"], rows)
 
-    out_file = f"today_attendance.xlsx"
-    wb.save(out_file)
 
-    return send_file(out_file, as_attachment=True)
+@app.route("/export_today")
+@login_required
+def export_today():
+    today = date.today()
+    # Every student, including ones added since today's rows were created
+    rows = ((name, roll, str(today), today.strftime("%A"), status)
+            for name, roll, status in roster_rows(today))
+    return export_response("today_attendance", f"Attendance {today}",
+                           ["Name", "Roll No", "Date", "Day", "Status"], rows)
 
 
 # ---------------- MONTHLY ATTENDANCE ----------------
@@ -354,30 +570,47 @@ def export_today():
 @login_required
 def attendance_monthly():
     today = date.today()
-    year, month = today.year, today.month
-    _, days = calendar.monthrange(year, month)
+    year = request.args.get("year", today.year, type=int)
+    month = request.args.get("month", today.month, type=int)
+    if not 1 <= year <= 9999:
+        return jsonify({"error": "year must be between 1 and 9999"}), 400
+    if not 1 <= month <= 12:
+        month = today.month
 
-    summary = {}
-    for d in range(1, days + 1):
-        day_date = date(year, month, d)
-        present = Attendance.query.filter_by(date=day_date, status="Present").count()
-        absent = Attendance.query.filter_by(date=day_date, status="Absent").count()
-        summary[d] = {"present": present, "absent": absent}
+    start, end = month_bounds(year, month)
+    by_date = daily_status_counts(start, end)
+    summary = {d.day: counts for d, counts in by_date.items()}
+
+    # The arrows stay on the first / last representable month
+    prev_month = start - timedelta(days=1) if start > date.min else start
+    next_month = end + timedelta(days=1) if end < date.max else end
 
     return render_template("attendance_monthly.html",
-                           days=range(1, days + 1),
+                           days=range(1, end.day + 1),
                            summary=summary,
                            year=year,
                            month=month,
+                           prev_month=prev_month,
+                           next_month=next_month,
                            date=date)
 
 
 # ---------------- DAY ATTENDANCE ----------------
+def _selected_day(day):
+    """The date of ?year=&month= (default: this month) and day; ValueError if there is no such date."""
+    today = date.today()
+    year = request.args.get("year", today.year, type=int)
+    month = request.args.get("month", today.month, type=int)
+    return date(year, month, day)
+
+
 @app.route("/attendance/day/<int:day>")
 @login_required
 def attendance_day(day):
-    today = date.today()
-    selected = date(today.year, today.month, day)
+    try:
+        selected = _selected_day(day)
+    except ValueError:
+        return jsonify({"error": "no such date"}), 400
 
     sql = text("""
         SELECT s.full_name, s.roll_no, a.status
@@ -398,32 +631,14 @@ def attendance_day(day):
 @app.route("/export_day/<int:day>")
 @login_required
 def export_day(day):
-    today = date.today()
-    selected = date(today.year, today.month, day)
-
-    sql = text("""
-        SELECT s.full_name, s.roll_no, a.status
-        FROM attendance a
-        JOIN student s ON a.student_id = s.id
-        WHERE a.date = :d
-        ORDER BY s.roll_no
-    """)
-
-    rows = db.session.execute(sql, {"d": selected}).fetchall()
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"Attendance {selected}"
-
-    ws.append(["Name", "Roll No", "Status"])
-
-    for name, roll, status in rows:
-        ws.append([name, roll, status])
-
-    filename = f"attendance_{selected}.xlsx"
-    wb.save(filename)
+    try:
+        selected = _selected_day(day)
+    except ValueError:
+        return jsonify({"error": "no such date"}), 400
 
-    return send_file(filename, as_attachment=True)
+    rows = ((name, roll, status) for _, _, name, roll, status in attendance_rows(selected, selected))
+    return export_response(f"attendance_{selected}", f"Attendance {selected}",
+                           ["Name", "Roll No", "Status"], rows)
 
 @app.route("/attendance/student/<int:student_id>")
 @login_required
@@ -470,112 +685,73 @@ def attendance_student_month(student_id):
 def export_student_month(student_id):
     student = Student.query.get_or_404(student_id)
 
-    today = date.today()
-    year = today.year
-    month = today.month
-
-    # Get attendance records
-    records = Attendance.query.filter(
-        Attendance.student_id == student_id,
-        Attendance.date.between(date(year, month, 1), date(year, month, 31))
-    ).order_by(Attendance.date).all()
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"{student.full_name} Attendance"
-
-    ws.append(["Date", "Day", "Status"])
-
-    for r in records:
-        ws.append([str(r.date), r.day_of_week, r.status])
-
-    filename = f"{student.full_name}_attendance_{month}_{year}.xlsx"
-    filepath = os.path.join(BASE_DIR, filename)
-    wb.save(filepath)
-
-    return send_file(filepath, as_attachment=True)
-
-
-def calculate_attendance_percent(student_id):
-    today = date.today()
-    year, month = today.year, today.month
-    start_date = date(year, month, 1)
-    end_date = date(year, month, calendar.monthrange(year, month)[1])
-
-    # Count present days
-    present_count = Attendance.query.filter(
-        Attendance.student_id == student_id,
-        Attendance.date.between(start_date, end_date),
-        Attendance.status == "Present"
-    ).count()
-
-    # Count total weekdays in the month
-    total_weekdays = 0
-    current = start_date
-    while current <= end_date:
-        if current.weekday() < 5:  # Monday to Friday
-            total_weekdays += 1
-        current += timedelta(days=1)
-
-    if total_weekdays == 0:
-        return 0
-    return round((present_count / total_weekdays) * 100, 2)
-
-
-def generate_excel_for_student(student_id):
-    student = Student.query.get_or_404(student_id)
-    today = date.today()
-    year, month = today.year, today.month
-
-    # Get attendance records
-    records = Attendance.query.filter(
-        Attendance.student_id == student_id,
-        Attendance.date.between(date(year, month, 1), date(year, month, 31))
-    ).order_by(Attendance.date).all()
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"{student.full_name} Attendance"
-
-    ws.append(["Date", "Day", "Status"])
-
-    for r in records:
-        ws.append([str(r.date), r.day_of_week, r.status])
-
-    filename = f"{student.full_name}_attendance_{month}_{year}.xlsx"
-    filepath = os.path.join(BASE_DIR, filename)
-    wb.save(filepath)
+    # This month by default, or any ?start=&end= range
+    month_start, month_end = month_bounds(date.today().year, date.today().month)
+    try:
+        start = _date_arg("start", month_start)
+        end = _date_arg("end", month_end)
+    except ValueError:
+        return jsonify({"error": "dates must be YYYY-MM-DD"}), 400
 
-    return filepath
+    rows = ((str(d), day, status) for d, day, _, _, status in attendance_rows(start, end, [student_id]))
+    filename = f"{student.full_name}_attendance_{start.month}_{start.year}"
+    return export_response(filename, f"{student.full_name} Attendance",
+                           ["Date", "Day", "Status"], rows)
 
 
 @app.route("/notify_monthly", methods=["POST"])
 @login_required
 def notify_monthly():
-    students = Student.query.all()
-
-    for s in students:
-        percent = calculate_attendance_percent(s.id)
-        excel_path = generate_excel_for_student(s.id)
-
-        notify_student(s, percent, excel_path)
+    today = date.today()
+    year = request.form.get("year", today.year, type=int)
+    month = request.form.get("month", today.month, type=int)
 
-    flash("Monthly notifications sent successfully")
-    return redirect(url_for("attendance_monthly"))
+    # Rendered and sent in the background; progress at /jobs/<id>. Own lane,
+    # so enrollment, rebuild and warm-up jobs do not wait behind it.
+    job = job_queue.submit("notify", notify_monthly_job, app, year, month,
+                           request.form.get("transport"), key=("notify", year, month), lane="notify")
+    flash(f"Monthly notifications queued (job #{job.id})")
+    return redirect(url_for("attendance_monthly", year=year, month=month))
 
 @app.route("/get_attendance_count")
 @login_required
 def get_attendance_count():
     try:
-        today = date.today()
-        # This counts unique students who are marked "Present" today
-        count = Attendance.query.filter_by(date=today, status="Present").count()
+        # Served from memory, same as the /events stream
+        count = attendance_cache.present_count()
         return jsonify({"success": True, "count": count})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
     
+# ---------------- LIVE EVENTS ----------------
+@app.route("/events")
+@login_required
+def events():
+    snapshot = {"count": attendance_cache.present_count(), "time": datetime.now().strftime("%H:%M:%S")}
+    stream = attendance_events.stream(snapshot, request.headers.get("Last-Event-ID"))
+    return Response(stream, mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ---------------- METRICS ----------------
+# Queue depths are read when /metrics is scraped
+metrics.gauge("recognition_queue_depth", "Frames waiting for the recognition backend",
+              fn=lambda: camera_hub.backend.stats()["queued"])
+metrics.gauge("attendance_writer_queue_depth", "Sightings waiting to be written",
+              fn=lambda: attendance_writer.stats()["queue_depth"])
+metrics.gauge("api_recognition_queue_depth", "Frames waiting for an API recognition batch",
+              fn=lambda: api_batcher.stats()["queued"])
+metrics.gauge("job_queue_depth", "Background jobs waiting to run", fn=job_queue.depth)
+metrics.gauge("event_stream_clients", "Open /events connections", fn=lambda: attendance_events.clients)
+metrics.gauge("camera_viewers", "Clients watching each camera", ["camera"],
+              fn=lambda: {cam_id: c["viewers"] for cam_id, c in camera_hub.stats()["cameras"].items()})
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    # Unauthenticated so Prometheus can scrape it; counts and timings only, no names
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 # ---------------- INIT ----------------
 if __name__ == "__main__":
-    with app.app_context():
-        db.create_all()
     app.run(debug=True)
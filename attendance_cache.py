@@ -0,0 +1,87 @@
+# attendance_cache.py
+# Process-level cache for the webcam hot path: student name -> id, and the
+# set of students already marked Present today. Repeat sightings of the same
+# student then never touch the database.
+#
+# A claim stays pending until the write-behind writer confirms the row is
+# committed, so rebuilding the set from the database never forgets it.
+#
+# Must be used inside an app context (it loads lazily from the DB).
+import threading
+from datetime import date
+
+from models import db, Student, Attendance
+
+
+class AttendanceCache:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._name_to_id = None
+        self._day = None
+        self._marked = set()
+        self._pending = {}           # student_id -> day, claimed but not committed yet
+
+    def invalidate(self):
+        """
+        Reload names and today's marks on next use; call when students are
+        added, updated or deleted. Claims still waiting for the writer are kept.
+        """
+        with self._lock:
+            self._name_to_id = None
+            self._day = None
+
+    def lookup(self, student_name):
+        """Return the student id for a recognized name, or None."""
+        with self._lock:
+            if self._name_to_id is None:
+                self._name_to_id = {}
+                # Ordered by id so duplicate names resolve like .first() did
+                for sid, full_name in db.session.query(Student.id, Student.full_name).order_by(Student.id):
+                    self._name_to_id.setdefault(full_name.lower(), sid)
+            return self._name_to_id.get(student_name.lower())
+
+    def claim(self, student_id):
+        """
+        Atomically mark a student as seen today.
+        Returns True only for the first sighting of the day, so the caller
+        knows it has to write the record.
+        """
+        with self._lock:
+            self._roll_day()
+            if student_id in self._marked:
+                return False
+            self._marked.add(student_id)
+            self._pending[student_id] = self._day
+            return True
+
+    def present_count(self):
+        """Students marked Present today, without a query after the first call of the day."""
+        with self._lock:
+            self._roll_day()
+            return len(self._marked)
+
+    def confirm(self, student_id):
+        """The writer committed this student's row; the database now holds the claim."""
+        with self._lock:
+            self._pending.pop(student_id, None)
+
+    def release(self, student_id):
+        """Undo a claim whose database write failed."""
+        with self._lock:
+            self._marked.discard(student_id)
+            self._pending.pop(student_id, None)
+
+    def _roll_day(self):
+        today = date.today()
+        if self._day == today:
+            return
+        self._day = today
+        self._pending = {sid: day for sid, day in self._pending.items() if day == today}
+        self._marked = {
+            sid for (sid,) in db.session.query(Attendance.student_id)
+            .filter_by(date=today, status="Present")
+        } | set(self._pending)
+
+
+attendance_cache = AttendanceCache()
@@ -0,0 +1,90 @@
+# attendance_events.py
+# In-memory fan-out of live attendance events to dashboards over
+# Server-Sent Events. mark_attendance() publishes once per new sighting and
+# every connected browser gets it immediately, so open dashboards cost no
+# database queries at all.
+import json
+import threading
+import collections
+
+HISTORY_SIZE = 20            # recent events replayed to new / reconnecting clients
+CLIENT_QUEUE_SIZE = 100      # a stalled client drops its oldest events
+HEARTBEAT_SECONDS = 15       # keeps proxies from closing idle streams
+
+
+def format_sse(data, event=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class EventBroadcaster:
+
+    def __init__(self, history=HISTORY_SIZE, client_queue=CLIENT_QUEUE_SIZE):
+        self._cond = threading.Condition()
+        self._recent = collections.deque(maxlen=history)
+        self._clients = []              # one event deque per connected client
+        self._client_queue = client_queue
+        self._next_id = 1
+        self.published = 0
+
+    def publish(self, event, data):
+        with self._cond:
+            item = (self._next_id, event, data)
+            self._next_id += 1
+            self.published += 1
+            self._recent.append(item)
+            for queue in self._clients:
+                queue.append(item)
+            self._cond.notify_all()
+
+    def recent(self, after_id=0):
+        with self._cond:
+            return [item for item in self._recent if item[0] > after_id]
+
+    @property
+    def clients(self):
+        return len(self._clients)
+
+    def stream(self, snapshot, last_event_id=None, heartbeat=HEARTBEAT_SECONDS):
+        """
+        SSE generator for one client: the recent events it has not seen
+        yet, a "snapshot" event with the current state, then live events.
+        """
+        queue = collections.deque(maxlen=self._client_queue)
+        with self._cond:
+            self._clients.append(queue)
+            try:
+                after = int(last_event_id or 0)
+            except ValueError:
+                after = 0
+            backlog = [item for item in self._recent if item[0] > after]
+
+        try:
+            yield "retry: 3000\n\n"
+            # Replayed first, so the snapshot's counts are the ones left on screen
+            for event_id, event, data in backlog:
+                yield format_sse(data, event, event_id)
+            yield format_sse(snapshot, "snapshot")
+
+            while True:
+                with self._cond:
+                    if not queue:
+                        self._cond.wait(heartbeat)
+                    items = list(queue)
+                    queue.clear()
+                if not items:
+                    # Comment line; also how a closed connection is noticed
+                    yield ": ping\n\n"
+                for event_id, event, data in items:
+                    yield format_sse(data, event, event_id)
+        finally:
+            with self._cond:
+                self._clients.remove(queue)
+
+
+attendance_events = EventBroadcaster()
@@ -0,0 +1,220 @@
+# attendance_writer.py
+# Write-behind batching for webcam attendance. Sightings are queued and a
+# background flusher writes them in one transaction every FLUSH_INTERVAL_MS
+# or every MAX_BATCH events, so SQLite sees a handful of commits per minute
+# instead of one per recognized frame.
+import threading
+import queue
+import time
+from datetime import datetime
+
+from sqlalchemy.dialects.sqlite import insert
+from models import db, Attendance
+import metrics
+
+FLUSH_INTERVAL_MS = 500
+MAX_BATCH = 50
+FLUSH_TIMEOUT = 5.0      # seconds flush() waits for the flusher's in-hand batch
+
+_FLUSH = object()        # queued by flush() to make the flusher write what it holds now
+
+COMMIT_SECONDS = metrics.histogram("attendance_commit_seconds", "Upsert and commit time of one attendance batch")
+FLUSH_EVENTS = metrics.histogram("attendance_flush_events", "Sightings written per attendance batch",
+                                 buckets=(1, 2, 5, 10, 25, 50, 100))
+FAILED_FLUSHES = metrics.counter("attendance_flush_failures_total", "Attendance batches that failed to commit")
+
+
+class AttendanceWriter:
+
+    def __init__(self, app, flush_interval_ms=FLUSH_INTERVAL_MS, max_batch=MAX_BATCH,
+                 on_failed=None, on_written=None):
+        self.app = app
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch = max_batch
+        self.on_failed = on_failed       # called with student_id for every event lost in a failed write
+        self.on_written = on_written     # called with student_id for every row committed
+
+        self._queue = queue.Queue()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # Events submitted / written (or failed); flush() waits for the two to meet
+        self._done_cond = threading.Condition()
+        self._submitted = 0
+        self._done = 0
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "batches": 0,
+            "events": 0,
+            "rows_written": 0,
+            "failed_batches": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    # ---------------- PRODUCER ----------------
+    def submit(self, student_id, when=None):
+        self.start()
+        with self._done_cond:
+            self._submitted += 1
+        self._queue.put((student_id, when or datetime.now()))
+
+    # ---------------- LIFECYCLE ----------------
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and durably write whatever is still queued."""
+        self._stop.set()
+        if self._thread is not None:
+            self._queue.put(_FLUSH)      # wake the flusher instead of waiting out its interval
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """
+        Write every event submitted so far before returning, including a
+        batch the flusher thread is still collecting. Safe to call from any
+        thread. Returns False if the flusher did not finish within timeout.
+        """
+        with self._done_cond:
+            target = self._submitted
+        while True:
+            batch = self._drain(self.max_batch)
+            if not batch:
+                break
+            self._write(batch)
+        # Queued after draining, so the flusher rather than this thread takes it
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(_FLUSH)
+        with self._done_cond:
+            return self._done_cond.wait_for(lambda: self._done >= target, timeout)
+
+    # ---------------- FLUSHER ----------------
+    def _run(self):
+        while not self._stop.is_set():
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _FLUSH:
+                    break
+                batch.append(item)
+            if batch:
+                self._write(batch)
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _FLUSH:
+                batch.append(item)
+        return batch
+
+    def _write(self, batch):
+        try:
+            self._write_batch(batch)
+        finally:
+            with self._done_cond:
+                self._done += len(batch)
+                self._done_cond.notify_all()
+
+    def _write_batch(self, batch):
+        # Coalesce: one row per (student, day), keeping the latest sighting
+        latest = {}
+        for student_id, when in batch:
+            key = (student_id, when.date())
+            if key not in latest or when > latest[key]:
+                latest[key] = when
+
+        by_day = {}
+        for (student_id, day), when in latest.items():
+            by_day.setdefault(day, {})[student_id] = when
+
+        started = time.perf_counter()
+        with self._write_lock, self.app.app_context():
+            try:
+                rows = self._upsert(by_day)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print("❌ Attendance flush failed:", e)
+                FAILED_FLUSHES.inc()
+                with self._stats_lock:
+                    self._stats["failed_batches"] += 1
+                if self.on_failed:
+                    for student_id, _ in latest:
+                        self.on_failed(student_id)
+                return
+        if self.on_written:
+            for student_id, _ in latest:
+                self.on_written(student_id)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        COMMIT_SECONDS.observe(elapsed_ms / 1000)
+        FLUSH_EVENTS.observe(len(batch))
+
+        with self._stats_lock:
+            s = self._stats
+            s["batches"] += 1
+            s["events"] += len(batch)
+            s["rows_written"] += rows
+            s["last_batch_size"] = len(batch)
+            s["max_batch_size"] = max(s["max_batch_size"], len(batch))
+            s["last_flush_ms"] = elapsed_ms
+            s["max_flush_ms"] = max(s["max_flush_ms"], elapsed_ms)
+            s["total_flush_ms"] += elapsed_ms
+
+    def _upsert(self, by_day):
+        """INSERT ... ON CONFLICT (student_id, date) DO UPDATE, one statement per batch."""
+        rows = [
+            {
+                "student_id": student_id,
+                "date": day,
+                "day_of_week": day.strftime("%A"),
+                "status": "Present",
+                "timestamp": when,
+                "source": "webcam",
+            }
+            for day, seen in by_day.items()
+            for student_id, when in seen.items()
+        ]
+
+        stmt = insert(Attendance).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Attendance.student_id, Attendance.date],
+            set_={
+                "status": stmt.excluded.status,
+                "timestamp": stmt.excluded.timestamp,
+            },
+        )
+        db.session.execute(stmt)
+        return len(rows)
+
+    # ---------------- METRICS ----------------
+    def stats(self):
+        with self._stats_lock:
+            s = dict(self._stats)
+        s["queue_depth"] = self._queue.qsize()
+        s["avg_batch_size"] = round(s["events"] / s["batches"], 2) if s["batches"] else 0
+        s["avg_flush_ms"] = round(s["total_flush_ms"] / s["batches"], 3) if s["batches"] else 0
+        return s
@@ -0,0 +1,138 @@
+# bench_attendance_indexes.py
+# Times the hot attendance queries on a synthetic database before and after
+# the upgrade_db.py index migration.
+#
+# Run: python bench_attendance_indexes.py --rows 1000000 --students 2000
+import os
+import time
+import sqlite3
+import argparse
+import tempfile
+import statistics
+from datetime import date, timedelta
+
+from upgrade_db import migrate
+
+# The pre-migration schema, as db.create_all() used to build it
+BASE_SCHEMA = """
+CREATE TABLE student (
+    id INTEGER PRIMARY KEY,
+    full_name VARCHAR(120) NOT NULL,
+    roll_no VARCHAR(50) NOT NULL UNIQUE,
+    mobile VARCHAR(20),
+    email VARCHAR(120),
+    image_folder VARCHAR(300) NOT NULL
+);
+CREATE TABLE attendance (
+    id INTEGER PRIMARY KEY,
+    student_id INTEGER NOT NULL REFERENCES student (id),
+    date DATE NOT NULL,
+    day_of_week VARCHAR(20),
+    status VARCHAR(20),
+    timestamp DATETIME,
+    source VARCHAR(50)
+);
+"""
+
+
+def build_db(path, n_rows, n_students):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO student (id, full_name, roll_no, image_folder) VALUES (?, ?, ?, ?)",
+        ((i, f"Student {i}", f"R{i:05d}", "") for i in range(1, n_students + 1))
+    )
+
+    n_days = -(-n_rows // n_students)
+    start = date.today() - timedelta(days=n_days - 1)
+
+    def rows():
+        count = 0
+        for d in range(n_days):
+            day = start + timedelta(days=d)
+            iso, dow = day.isoformat(), day.strftime("%A")
+            for sid in range(1, n_students + 1):
+                if count == n_rows:
+                    return
+                status = "Present" if (sid * 7 + d) % 5 else "Absent"
+                yield sid, iso, dow, status, f"{iso} 09:00:00", "webcam"
+                count += 1
+
+    conn.executemany(
+        "INSERT INTO attendance (student_id, date, day_of_week, status, timestamp, source) "
+        "VALUES (?, ?, ?, ?, ?, ?)", rows()
+    )
+    conn.commit()
+    return conn, start
+
+
+def queries(today, n_students):
+    month_start = today.replace(day=1).isoformat()
+    sid = n_students // 2
+    return {
+        "present count (date, status)": (
+            "SELECT COUNT(*) FROM attendance WHERE date = ? AND status = 'Present'",
+            (today.isoformat(),)),
+        "monthly GROUP BY (date range)": (
+            "SELECT date, status, COUNT(id) FROM attendance WHERE date BETWEEN ? AND ? GROUP BY date, status",
+            (month_start, today.isoformat())),
+        "day roster join (date)": (
+            "SELECT s.full_name, s.roll_no, a.status FROM attendance a JOIN student s ON a.student_id = s.id "
+            "WHERE a.date = ? ORDER BY s.roll_no",
+            (today.isoformat(),)),
+        "student month (student_id, date range)": (
+            "SELECT date, status FROM attendance WHERE student_id = ? AND date BETWEEN ? AND ? ORDER BY date",
+            (sid, month_start, today.isoformat())),
+        "upsert lookup (student_id, date)": (
+            "SELECT id FROM attendance WHERE student_id = ? AND date = ?",
+            (sid, today.isoformat())),
+        "name lookup lower(full_name)": (
+            "SELECT id FROM student WHERE lower(full_name) = ?",
+            (f"student {sid}",)),
+    }
+
+
+def time_queries(conn, qs, repeat):
+    results = {}
+    for label, (sql, params) in qs.items():
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            samples.append((time.perf_counter() - t0) * 1000)
+        results[label] = statistics.median(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+
+        t0 = time.perf_counter()
+        conn, _ = build_db(path, args.rows, args.students)
+        print(f"Built {args.rows:,} attendance rows in {time.perf_counter() - t0:.1f}s")
+
+        qs = queries(date.today(), args.students)
+        before = time_queries(conn, qs, args.repeat)
+
+        t0 = time.perf_counter()
+        migrate(conn)
+        print(f"Migration took {time.perf_counter() - t0:.1f}s\n")
+
+        after = time_queries(conn, qs, args.repeat)
+        conn.close()
+
+    print(f"{'query':42} {'before ms':>10} {'after ms':>10} {'speedup':>9}")
+    for label in qs:
+        b, a = before[label], after[label]
+        print(f"{label:42} {b:10.2f} {a:10.2f} {b / a if a else float('inf'):8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# bench_detection_scale.py
+# Compares detection latency and recognition accuracy across DETECTION_SCALE
+# values on the stored student_images.
+#
+# Every image is first resized to webcam width, then MTCNN runs on a copy
+# downscaled by each scale factor while the face crop for the resnet is
+# always taken from the full-resolution image. Each image is identified
+# against the embedding store minus its own rows (leave-one-image-out), so
+# accuracy is not inflated by matching an image against itself.
+#
+# Run: python bench_detection_scale.py --scales 1.0,0.75,0.5,0.35,0.25
+import os
+import time
+import argparse
+import numpy as np
+from PIL import Image
+
+import recognize_knn_attendance as rec
+from embedding_index import l2_normalize
+from embedding_store import EmbeddingStore, EMBEDDING_DIR
+from enrollment import student_label, file_sha1, list_images
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(BASE_DIR, "student_images")
+
+
+def load_probes(dataset_path, frame_width, limit):
+    """(path, sha1, label, PIL image at webcam width) for every student image."""
+    probes = []
+    for name in sorted(os.listdir(dataset_path)):
+        folder = os.path.join(dataset_path, name)
+        if not os.path.isdir(folder):
+            continue
+        for path in list_images(folder)[:limit]:
+            img = Image.open(path).convert("RGB")
+            if img.width > frame_width:
+                img = img.resize((frame_width, round(img.height * frame_width / img.width)), Image.BILINEAR)
+            probes.append((path, file_sha1(path), student_label(name), img))
+    return probes
+
+
+class Reference:
+    """
+    Every stored embedding in one normalized matrix, shared by all probes.
+    classify() masks out the probe image's own rows (leave-one-image-out)
+    and otherwise resolves like EmbeddingIndex.classify().
+    """
+
+    def __init__(self, matrix, meta):
+        self.matrix = l2_normalize(matrix)
+        labels = [m["label"] for m in meta]
+        # Codes in order of first appearance, like EmbeddingIndex, so ties break the same way
+        self.classes = list(dict.fromkeys(labels))
+        code_of = {label: i for i, label in enumerate(self.classes)}
+        self.codes = np.array([code_of[label] for label in labels], dtype=np.int64)
+        self.rows_by_sha1, self.rows_by_path = {}, {}
+        for i, m in enumerate(meta):
+            if m.get("sha1"):
+                self.rows_by_sha1.setdefault(m["sha1"], []).append(i)
+            if m.get("image"):
+                self.rows_by_path.setdefault(os.path.abspath(m["image"]), []).append(i)
+
+    def own_rows(self, path, digest):
+        return sorted(set(self.rows_by_sha1.get(digest, []) + self.rows_by_path.get(os.path.abspath(path), [])))
+
+    def classify(self, emb, own, k, mode):
+        """(label, distance, confidence) of one embedding, ignoring rows own."""
+        sims = (l2_normalize(emb) @ self.matrix.T)[0]
+        keep = np.ones(len(sims), dtype=bool)
+        keep[own] = False
+        if not keep.any():
+            return None, 1.0, 0.0
+
+        if mode == "centroid":
+            sums = np.zeros((len(self.classes), self.matrix.shape[1]), dtype=np.float32)
+            np.add.at(sums, self.codes[keep], self.matrix[keep])
+            present = np.bincount(self.codes[keep], minlength=len(self.classes)) > 0
+            class_sims = l2_normalize(sums) @ l2_normalize(emb)[0]
+            class_sims[~present] = -np.inf
+            best = int(class_sims.argmax())
+            return self.classes[best], 1.0 - float(class_sims[best]), 1.0
+
+        sims[~keep] = -np.inf
+        k = min(k, int(keep.sum()))
+        top = np.argsort(-sims)[:k]
+        votes = np.bincount(self.codes[top], minlength=len(self.classes))
+        best = int(votes.argmax())
+        return self.classes[best], 1.0 - float(sims[top[0]]), votes[best] / k
+
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q)) if samples else 0.0
+
+
+def run_scale(scale, probes, reference):
+    detect_ms, embed_ms = [], []
+    correct = wrong = rejected = missed = 0
+
+    for path, digest, label, img in probes:
+        t0 = time.perf_counter()
+        boxes = rec.detect_faces(img, multi_face=False, scale=scale)
+        detect_ms.append((time.perf_counter() - t0) * 1000)
+        if len(boxes) == 0:
+            missed += 1
+            continue
+
+        t0 = time.perf_counter()
+        emb = rec.embed_faces(img, boxes)
+        embed_ms.append((time.perf_counter() - t0) * 1000)
+
+        name, dist, conf = reference.classify(emb[:1], reference.own_rows(path, digest),
+                                              k=rec.N_NEIGHBORS, mode=rec.INDEX_MODE)
+        if not rec._is_known(name, dist, conf):
+            rejected += 1
+        elif name == label:
+            correct += 1
+        else:
+            wrong += 1
+
+    n = len(probes)
+    return {
+        "scale": scale,
+        "detect_p50": percentile(detect_ms, 50),
+        "detect_p95": percentile(detect_ms, 95),
+        "embed_p50": percentile(embed_ms, 50),
+        "accuracy": correct / n if n else 0.0,
+        "wrong": wrong,
+        "rejected": rejected,
+        "missed": missed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--store", default=EMBEDDING_DIR, help="embedding store directory")
+    parser.add_argument("--scales", default="1.0,0.75,0.5,0.35,0.25")
+    parser.add_argument("--frame-width", type=int, default=640, help="images are resized to this width first")
+    parser.add_argument("--per-student", type=int, default=None, help="limit images per student")
+    args = parser.parse_args()
+
+    matrix, meta = EmbeddingStore(args.store).load_live()
+    if not len(meta):
+        print("⚠️ Embedding store is empty, run generate_embeddings_per_image.py first")
+        return
+
+    probes = load_probes(args.dataset, args.frame_width, args.per_student)
+    reference = Reference(matrix, meta)
+    print(f"📂 {len(probes)} images, {len(meta)} stored embeddings\n")
+
+    # Warm-up so the first scale does not pay for lazy torch initialisation
+    if probes:
+        rec.detect_faces(probes[0][3], multi_face=False, scale=1.0)
+
+    scales = [float(s) for s in args.scales.split(",")]
+    results = [run_scale(scale, probes, reference) for scale in scales]
+
+    print(f"{'scale':>6} {'detect p50':>11} {'detect p95':>11} {'embed p50':>10} "
+          f"{'accuracy':>9} {'wrong':>6} {'unknown':>8} {'no face':>8}")
+    for r in results:
+        print(f"{r['scale']:6.2f} {r['detect_p50']:9.1f}ms {r['detect_p95']:9.1f}ms {r['embed_p50']:8.1f}ms "
+              f"{r['accuracy']:9.1%} {r['wrong']:6d} {r['rejected']:8d} {r['missed']:8d}")
+
+    base = next((r for r in results if r["scale"] == 1.0), None)
+    if base and base["detect_p50"]:
+        print()
+        for r in results:
+            if r is not base and r["detect_p50"]:
+                print(f"📉 scale {r['scale']:.2f}: detection {base['detect_p50'] / r['detect_p50']:.1f}x faster, "
+                      f"accuracy {100 * (r['accuracy'] - base['accuracy']):+.1f} pts")
+
+
+if __name__ == "__main__":
+    main()
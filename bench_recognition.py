@@ -0,0 +1,303 @@
+# bench_recognition.py
+# Replays stored student images (or a recorded video) through the webcam
+# recognition and attendance path without a camera, and reports per-stage
+# latency, frames/sec and peak memory.
+#
+# Stages: read (decode), convert (cvtColor), detect (MTCNN), track, crop,
+# embed (InceptionResnetV1), identify (index search), mark
+# (mark_attendance), commit (attendance writer flush), draw and encode
+# (JPEG). Every comma-separated option is a dimension; all combinations are
+# benchmarked.
+#
+# Attendance is marked in a scratch copy of attendance.db, never the real one.
+#
+#   python bench_recognition.py --limit 200
+#   python bench_recognition.py --video hallway.mp4 --tracking
+#   python bench_recognition.py --threads 1,4 --batch 1,4 --scale 1.0,0.5 --index knn,centroid --out bench.json
+#   python bench_recognition.py --compare bench.json
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import itertools
+import platform
+import tempfile
+from datetime import datetime
+import numpy as np
+import cv2
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(BASE_DIR, "student_images")
+DB_PATH = os.path.join(BASE_DIR, "attendance.db")
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+STAGES = ["read", "convert", "detect", "track", "crop", "embed", "identify",
+          "mark", "commit", "draw", "encode", "total"]
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process, or None where it can't be read."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil     # Windows: peak working set
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 2 ** 20, 1)
+    except ImportError:
+        return None
+
+
+# ---------------- FRAME SOURCES ----------------
+def image_frames(dataset_path, width, limit):
+    paths = sorted(
+        os.path.join(root, f) for root, _, files in os.walk(dataset_path)
+        for f in files if f.lower().endswith(IMAGE_EXTS)
+    )
+    for path in paths[:limit]:
+        t0 = time.perf_counter()
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        if frame.shape[1] > width:
+            frame = cv2.resize(frame, (width, round(frame.shape[0] * width / frame.shape[1])),
+                               interpolation=cv2.INTER_AREA)
+        yield frame, (time.perf_counter() - t0) * 1000
+
+
+def video_frames(path, limit):
+    cap = cv2.VideoCapture(path)
+    try:
+        for _ in itertools.count() if limit is None else range(limit):
+            t0 = time.perf_counter()
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield frame, (time.perf_counter() - t0) * 1000
+    finally:
+        cap.release()
+
+
+def batched(frames, size):
+    batch = []
+    for item in frames:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---------------- SCRATCH DATABASE ----------------
+def prepare_database(tmp):
+    """Point the app at a scratch copy of attendance.db (or a fresh one) before it is imported."""
+    path = os.path.join(tmp, "attendance.db")
+    if os.path.exists(DB_PATH):
+        shutil.copy(DB_PATH, path)
+    os.environ["ATTENDANCE_DATABASE_URI"] = "sqlite:///" + path
+
+
+def seed_students(app, labels):
+    from models import db, Student
+    from recognize_knn_attendance import normalize_name
+    with app.app_context():
+        db.create_all()
+        if Student.query.count():
+            return
+        for i, label in enumerate(labels):
+            db.session.add(Student(full_name=normalize_name(label), roll_no=f"BENCH-{i:04d}", image_folder=""))
+        db.session.commit()
+
+
+# ---------------- BENCHMARK ----------------
+def summarize(samples):
+    if not samples:
+        return None
+    arr = np.asarray(samples)
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p95": round(float(np.percentile(arr, 95)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3),
+        "mean": round(float(arr.mean()), 3),
+    }
+
+
+def run_config(config, frames, args, appmod):
+    import torch
+    import recognize_knn_attendance as rec
+    from face_tracker import FaceTracker
+    from frame_pipeline import JPEG_QUALITY
+
+    torch.set_num_threads(config["threads"])
+    rec.DETECTION_SCALE = config["scale"]
+    rec.INDEX_MODE = config["index"]
+    tracker = FaceTracker() if args.tracking else None
+    params = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY]
+
+    samples = {stage: [] for stage in STAGES}
+    n_frames = n_faces = n_known = 0
+    seq = 0
+    started = time.perf_counter()
+
+    for batch in batched(frames, config["batch"]):
+        t_batch = time.perf_counter()
+        timings = {}
+        items = []
+        for frame, read_ms in batch:
+            items.append((frame, tracker, seq))
+            samples["read"].append(read_ms)
+            seq += 1
+        if tracker is not None and len(items) > 1:
+            # One tracker can only take one frame per batch (as one camera)
+            results = [rec.analyze_frames([item], timings=timings)[0] for item in items]
+        else:
+            results = rec.analyze_frames(items, timings=timings)
+
+        t = time.perf_counter()
+        with appmod.app.app_context():
+            for result in results:
+                for name in (result or {"names": []})["names"]:
+                    appmod.mark_attendance(name)
+        timings["mark"] = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        appmod.attendance_writer.flush()
+        timings["commit"] = (time.perf_counter() - t) * 1000
+
+        for (frame, _), result in zip(batch, results):
+            t = time.perf_counter()
+            drawn = rec.draw_result(frame.copy(), result) if result is not None else frame
+            timings["draw"] = timings.get("draw", 0.0) + (time.perf_counter() - t) * 1000
+            t = time.perf_counter()
+            cv2.imencode('.jpg', drawn, params)
+            timings["encode"] = timings.get("encode", 0.0) + (time.perf_counter() - t) * 1000
+            if result is not None:
+                n_faces += len(result["faces"])
+                n_known += len(result["names"])
+        timings["total"] = (time.perf_counter() - t_batch) * 1000
+
+        # Per-frame cost: batched stages are shared by the frames of the batch.
+        # Skipped stages (no face, track already confirmed) count as 0 ms.
+        for stage in STAGES[1:]:
+            samples[stage].append(timings.get(stage, 0.0) / len(batch))
+        n_frames += len(batch)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "config": config,
+        "frames": n_frames,
+        "faces": n_faces,
+        "identified": n_known,
+        "fps": round(n_frames / elapsed, 2) if elapsed else 0.0,
+        "stages_ms": {stage: summarize(samples[stage]) for stage in STAGES if samples[stage]},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_result(result):
+    c = result["config"]
+    print(f"\n⚙️ threads={c['threads']} batch={c['batch']} scale={c['scale']} index={c['index']}: "
+          f"{result['frames']} frames, {result['faces']} faces, {result['fps']} fps, "
+          f"peak RSS {result['peak_rss_mb']} MB")
+    print(f"   {'stage':10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, stats in result["stages_ms"].items():
+        print(f"   {stage:10} {stats['p50']:9.2f} {stats['p95']:9.2f} {stats['p99']:9.2f}")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {json.dumps(r["config"], sort_keys=True): r for r in json.load(f)["results"]}
+    print(f"\n📊 Compared with {baseline_path}")
+    for result in results:
+        old = baseline.get(json.dumps(result["config"], sort_keys=True))
+        if old is None:
+            continue
+        base_p50 = old["stages_ms"]["total"]["p50"]
+        p50 = result["stages_ms"]["total"]["p50"]
+        print(f"   {result['config']}: total p50 {base_p50:.1f} -> {p50:.1f} ms "
+              f"({100 * (p50 - base_p50) / base_p50:+.1f}%), fps {old['fps']} -> {result['fps']}")
+
+
+def parse_list(value, cast):
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--video", help="replay a recorded video instead of student_images")
+    parser.add_argument("--limit", type=int, default=None, help="frames per configuration")
+    parser.add_argument("--width", type=int, default=640, help="images are resized to this width, like a webcam frame")
+    parser.add_argument("--threads", default=str(os.cpu_count() or 1), help="torch intra-op threads")
+    parser.add_argument("--batch", default="1", help="frames per analyze_frames() call (cameras sharing a batch)")
+    parser.add_argument("--scale", default=None, help="detector scale factors (default: DETECTION_SCALE)")
+    parser.add_argument("--index", default=None, help="knn and/or centroid (default: INDEX_MODE)")
+    parser.add_argument("--tracking", action="store_true", help="run frames through a FaceTracker, as the live stream does")
+    parser.add_argument("--warmup", type=int, default=3, help="untimed frames before each configuration")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="a previous --out file to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_database(tmp)
+        import torch
+        import app as appmod
+        import recognize_knn_attendance as rec
+        seed_students(appmod.app, rec.index.current().classes)
+
+        configs = [
+            {"threads": t, "batch": b, "scale": s, "index": i}
+            for t, b, s, i in itertools.product(
+                parse_list(args.threads, int),
+                parse_list(args.batch, int),
+                parse_list(args.scale, float) if args.scale else [rec.DETECTION_SCALE],
+                parse_list(args.index, str) if args.index else [rec.INDEX_MODE],
+            )
+        ]
+
+        def frames():
+            if args.video:
+                return video_frames(args.video, args.limit)
+            return image_frames(args.dataset, args.width, args.limit)
+
+        results = []
+        for config in configs:
+            warm = list(itertools.islice(frames(), args.warmup))
+            if not warm:
+                print("⚠️ No frames to replay")
+                return
+            torch.set_num_threads(config["threads"])
+            rec.analyze_frames([(frame, None, None) for frame, _ in warm])
+
+            result = run_config(config, frames(), args, appmod)
+            print_result(result)
+            results.append(result)
+        appmod.attendance_writer.stop()
+        # Release the scratch database before its directory is removed
+        with appmod.app.app_context():
+            appmod.db.engine.dispose()
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "source": args.video or args.dataset,
+        "tracking": args.tracking,
+        "machine": {"platform": platform.platform(), "cpus": os.cpu_count(),
+                    "python": platform.python_version(), "torch": torch.__version__},
+        "index": rec.model_info(),
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"\n💾 Results saved to {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
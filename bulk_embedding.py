@@ -0,0 +1,149 @@
+# bulk_embedding.py
+# Bulk embedding of a whole photo archive.
+#
+# Images are hashed, decoded and letterboxed in a process pool, then MTCNN
+# and InceptionResnetV1 run on batches in the main process. Every batch is
+# appended to the embedding store as soon as it is done, and images whose
+# content hash is already stored are skipped, so an interrupted run resumes
+# where it stopped.
+import os
+import time
+import numpy as np
+import torch
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from PIL import Image
+
+from enrollment import student_label, file_sha1, list_images, rebuild_index
+from embedding_store import seed_from_legacy_knn
+
+BATCH_SIZE = 32
+MAX_SIDE = 640
+
+_known_hashes = set()
+_legacy_paths = set()
+_max_side = MAX_SIDE
+
+
+def _init_worker(known_hashes, legacy_paths, max_side):
+    global _known_hashes, _legacy_paths, _max_side
+    _known_hashes, _legacy_paths, _max_side = known_hashes, legacy_paths, max_side
+    # Decoding is the workers' only job; keep torch from oversubscribing
+    torch.set_num_threads(1)
+
+
+def _load(task):
+    """Hash, decode and letterbox one image. Returns None when already embedded."""
+    path, label = task
+    if path in _legacy_paths:
+        return None
+    digest = file_sha1(path)
+    if digest in _known_hashes:
+        return None
+
+    try:
+        img = Image.open(path).convert("RGB")
+    except Exception as e:
+        return path, label, digest, None, str(e)
+
+    # Same-size inputs let MTCNN run the whole batch at once
+    img.thumbnail((_max_side, _max_side))
+    canvas = Image.new("RGB", (_max_side, _max_side))
+    canvas.paste(img, (0, 0))
+    return path, label, digest, np.asarray(canvas), None
+
+
+def collect_tasks(dataset_path):
+    tasks = []
+    for name in sorted(os.listdir(dataset_path)):
+        folder = os.path.join(dataset_path, name)
+        if os.path.isdir(folder):
+            label = student_label(name)
+            tasks.extend((path, label) for path in list_images(folder))
+    return tasks
+
+
+def _embed_batch(batch, mtcnn, resnet, store):
+    faces = mtcnn([Image.fromarray(item[3]) for item in batch])
+
+    kept = [(item, face) for item, face in zip(batch, faces) if face is not None]
+    for item, face in zip(batch, faces):
+        if face is None:
+            print(f"⚠️ No face detected in {os.path.basename(item[0])}")
+    if not kept:
+        return 0
+
+    with torch.inference_mode():
+        embs = resnet(torch.stack([face for _, face in kept])).cpu().numpy()
+
+    store.append(
+        embs,
+        [item[1] for item, _ in kept],
+        [item[0] for item, _ in kept],
+        [{"sha1": item[2]} for item, _ in kept],
+    )
+    return len(kept)
+
+
+def run_bulk(dataset_path, store, mtcnn, resnet, batch_size=BATCH_SIZE,
+             workers=None, threads=None, max_side=MAX_SIDE):
+    """Embed every new image under dataset_path. Returns the number of embeddings added."""
+    if threads:
+        torch.set_num_threads(threads)
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+
+    tasks = collect_tasks(dataset_path)
+    seed_from_legacy_knn(store)
+    meta = store.metadata()
+    known = {m["sha1"] for m in meta if m.get("sha1")}
+    legacy = {m["image"] for m in meta if not m.get("sha1")}
+    print(f"📂 {len(tasks)} images found, {len(known) + len(legacy)} already embedded")
+
+    started = time.perf_counter()
+    seen = added = skipped = 0
+    batch = []
+    max_in_flight = workers * 4
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(known, legacy, max_side)) as pool:
+        pending = set()
+        task_iter = iter(tasks)
+
+        while True:
+            # Keep a bounded number of decoded images in flight
+            while len(pending) < max_in_flight:
+                task = next(task_iter, None)
+                if task is None:
+                    break
+                pending.add(pool.submit(_load, task))
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                seen += 1
+                item = future.result()
+                if item is None:
+                    skipped += 1
+                elif item[4] is not None:
+                    print(f"❌ Could not open {os.path.basename(item[0])}: {item[4]}")
+                else:
+                    batch.append(item)
+
+            while len(batch) >= batch_size:
+                added += _embed_batch(batch[:batch_size], mtcnn, resnet, store)
+                batch = batch[batch_size:]
+                elapsed = time.perf_counter() - started
+                print(f"⏱️ {seen}/{len(tasks)} images, {added} embedded, "
+                      f"{(seen - skipped) / elapsed:.1f} images/sec")
+
+        if batch:
+            added += _embed_batch(batch, mtcnn, resnet, store)
+
+    elapsed = time.perf_counter() - started
+    rate = (seen - skipped) / elapsed if elapsed else 0.0
+    print(f"\n🎯 {added} embeddings added, {skipped} skipped, "
+          f"{elapsed:.1f}s ({rate:.1f} images/sec)")
+
+    if added:
+        rebuild_index(store)
+    return added
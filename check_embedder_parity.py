@@ -0,0 +1,107 @@
+# check_embedder_parity.py
+# Checks that an optimized embedder backend (see embedders.py) still agrees
+# with the stored embeddings before switching EMBEDDER_BACKEND.
+#
+# Every image referenced by the embedding store is cropped once with MTCNN,
+# then embedded by each backend. Reported per backend:
+#   cosine   similarity to the stored embedding of the same image (mean / min)
+#   top-1    how often the nearest stored neighbour (excluding the image's own
+#            rows) has the same label as with the eager reference
+#   speed    ms per face at the given batch size
+#
+# Run: python check_embedder_parity.py --backends eager,torchscript,int8 --threads 4
+import os
+import time
+import argparse
+import numpy as np
+from PIL import Image
+
+from embedders import EMBEDDERS, build_embedder, load_resnet
+from embedding_index import EmbeddingIndex, l2_normalize
+from embedding_store import EmbeddingStore, EMBEDDING_DIR
+
+
+def load_faces(meta, limit):
+    """(row, crop tensor) for the stored rows whose image still exists."""
+    from facenet_pytorch import MTCNN
+    mtcnn = MTCNN(keep_all=False)
+    faces = []
+    for row, m in enumerate(meta):
+        if limit and len(faces) >= limit:
+            break
+        path = m.get("image")
+        if not path or not os.path.exists(path):
+            continue
+        face = mtcnn(Image.open(path).convert("RGB"))
+        if face is not None:
+            faces.append((row, face))
+    return faces
+
+
+def embed_all(embedder, crops, batch_size):
+    """(l2-normalized embeddings, ms per face)."""
+    import torch
+    embedder(crops[:1])   # warm-up: first call pays for lazy initialisation
+    out = []
+    started = time.perf_counter()
+    for i in range(0, len(crops), batch_size):
+        out.append(embedder(crops[i:i + batch_size]).cpu().numpy())
+    ms = (time.perf_counter() - started) * 1000 / len(crops)
+    return l2_normalize(np.concatenate(out)), ms
+
+
+def nearest_labels(embs, rows, matrix, labels):
+    """Label of the nearest stored embedding, skipping each probe's own row."""
+    index = EmbeddingIndex(matrix.shape[1])
+    index.add(matrix, labels)
+    sims = embs @ index.embeddings.T
+    sims[np.arange(len(rows)), rows] = -np.inf
+    return [labels[j] for j in sims.argmax(axis=1)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store", default=EMBEDDING_DIR, help="embedding store directory")
+    parser.add_argument("--backends", default=",".join(EMBEDDERS))
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=None, help="check at most this many images")
+    args = parser.parse_args()
+
+    matrix, meta = EmbeddingStore(args.store).load()
+    if not len(meta):
+        print("⚠️ Embedding store is empty, run generate_embeddings_per_image.py first")
+        return
+
+    import torch
+    faces = load_faces(meta, args.limit)
+    if not faces:
+        print("⚠️ None of the stored images could be read or cropped")
+        return
+    rows = np.array([row for row, _ in faces])
+    crops = torch.stack([face for _, face in faces])
+    stored = l2_normalize(matrix[rows])
+    labels = [m["label"] for m in meta]
+    print(f"📂 {len(faces)} faces from {len(meta)} stored embeddings\n")
+
+    results, reference = [], None
+    for name in args.backends.split(","):
+        t0 = time.perf_counter()
+        embedder = build_embedder(load_resnet(), name, args.threads)
+        build_s = time.perf_counter() - t0
+        embs, ms = embed_all(embedder, crops, args.batch_size)
+        cosine = np.sum(embs * stored, axis=1)
+        top1 = nearest_labels(embs, rows, matrix, labels)
+        if reference is None:
+            reference = top1
+        agree = np.mean([a == b for a, b in zip(top1, reference)])
+        results.append((name, build_s, ms, cosine.mean(), cosine.min(), agree))
+
+    print(f"{'backend':>12} {'build':>7} {'ms/face':>8} {'cos mean':>9} {'cos min':>8} {'top-1 agree':>12}")
+    for name, build_s, ms, mean, low, agree in results:
+        print(f"{name:>12} {build_s:6.1f}s {ms:8.1f} {mean:9.5f} {low:8.5f} {agree:12.1%}")
+    print(f"\n(top-1 agreement is relative to {args.backends.split(',')[0]})")
+
+
+if __name__ == "__main__":
+    main()
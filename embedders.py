@@ -0,0 +1,80 @@
+# embedders.py
+# Interchangeable CPU backends for the InceptionResnetV1 face embedder.
+#
+#   eager        fp32 eager PyTorch (reference; what the stored embeddings use)
+#   torchscript  traced and frozen TorchScript graph (fused conv+bn, no Python overhead)
+#   int8         dynamically quantized Linear layers (weights int8, activations fp32)
+#
+# Every backend is called like the resnet module itself -- a (n, 3, 160, 160)
+# tensor in, an (n, 512) tensor out -- and runs under torch.inference_mode.
+# Pick one with EMBEDDER_BACKEND and run check_embedder_parity.py before
+# switching: enrollment and recognition should use the same backend.
+import os
+import warnings
+
+EMBEDDER_BACKEND = os.environ.get("EMBEDDER_BACKEND", "eager")
+EMBEDDER_THREADS = int(os.environ.get("EMBEDDER_THREADS", "0"))   # 0: torch default
+INPUT_SHAPE = (1, 3, 160, 160)
+
+
+class EagerEmbedder:
+    name = "eager"
+
+    def __init__(self, resnet):
+        self.model = resnet.eval()
+
+    def __call__(self, faces):
+        import torch
+        with torch.inference_mode():
+            return self.model(faces)
+
+
+class TorchScriptEmbedder(EagerEmbedder):
+    name = "torchscript"
+
+    def __init__(self, resnet):
+        import torch
+        resnet = resnet.eval()
+        with torch.inference_mode():
+            traced = torch.jit.trace(resnet, torch.zeros(INPUT_SHAPE))
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            # Freezing inlines the weights and folds batch norms into the convolutions
+            self.model = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+
+class QuantizedEmbedder(EagerEmbedder):
+    """
+    Dynamic int8 quantization covers Linear layers only; the convolutions
+    of InceptionResnetV1 stay fp32, so expect a modest speed-up.
+    """
+    name = "int8"
+
+    def __init__(self, resnet):
+        import torch
+        from torch.ao.quantization import quantize_dynamic
+        self.model = quantize_dynamic(resnet.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+EMBEDDERS = {
+    "eager": EagerEmbedder,
+    "torchscript": TorchScriptEmbedder,
+    "int8": QuantizedEmbedder,
+}
+
+
+def build_embedder(resnet, backend=None, threads=None):
+    """Wrap an InceptionResnetV1 in the configured backend."""
+    import torch
+    backend = backend or EMBEDDER_BACKEND
+    if backend not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder backend: {backend} (choose from {', '.join(EMBEDDERS)})")
+    threads = EMBEDDER_THREADS if threads is None else threads
+    if threads:
+        torch.set_num_threads(threads)
+    return EMBEDDERS[backend](resnet)
+
+
+def load_resnet():
+    from facenet_pytorch import InceptionResnetV1
+    return InceptionResnetV1(pretrained='vggface2').eval()
@@ -0,0 +1,296 @@
+# embedding_index.py
+# In-memory face embedding index.
+# Embeddings are kept L2-normalized in one contiguous float32 matrix, so a
+# batch of cosine queries is a single matrix multiply. Supports per-student
+# centroid mode and add/remove without a full retrain.
+import os
+import time
+import threading
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.path.join(BASE_DIR, "embedding_index.npz")
+
+EMBEDDING_DIM = 512
+
+
+def l2_normalize(x):
+    x = np.asarray(x, dtype=np.float32)
+    if x.ndim == 1:
+        x = x.reshape(1, -1)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(x / norms, dtype=np.float32)
+
+
+class EmbeddingIndex:
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((0, dim), dtype=np.float32)   # capacity buffer
+        self._codes = np.zeros(0, dtype=np.int32)             # class code per row
+        self._size = 0
+        self.classes = []                                     # code -> label
+        self._class_codes = {}                                # label -> code
+        self._centroids = None
+        self.version = None                                   # set by save()/load()
+
+    # ---------------- SIZE ----------------
+    def __len__(self):
+        return self._size
+
+    @property
+    def embeddings(self):
+        return self._matrix[:self._size]
+
+    @property
+    def labels(self):
+        return np.asarray(self.classes, dtype=object)[self._codes[:self._size]]
+
+    # ---------------- MUTATION ----------------
+    def add(self, embeddings, labels):
+        """Append embeddings (n, dim) with one label each."""
+        vecs = l2_normalize(embeddings)
+        if len(vecs) != len(labels):
+            raise ValueError("embeddings and labels must have the same length")
+
+        with self._lock:
+            codes = np.array([self._code_for(label) for label in labels], dtype=np.int32)
+            self._reserve(self._size + len(vecs))
+            self._matrix[self._size:self._size + len(vecs)] = vecs
+            self._codes[self._size:self._size + len(vecs)] = codes
+            self._size += len(vecs)
+            self._centroids = None
+
+    def remove(self, label):
+        """Drop every embedding of a label. Returns how many were removed."""
+        with self._lock:
+            code = self._class_codes.get(label)
+            if code is None:
+                return 0
+            keep = self._codes[:self._size] != code
+            removed = self._size - int(keep.sum())
+            # New arrays rather than compacting in place, so concurrent
+            # searches holding the old view stay consistent
+            self._matrix = np.ascontiguousarray(self.embeddings[keep])
+            self._codes = self._codes[:self._size][keep]
+            self._size = len(self._matrix)
+            self._centroids = None
+            return removed
+
+    def _code_for(self, label):
+        code = self._class_codes.get(label)
+        if code is None:
+            code = len(self.classes)
+            self.classes.append(label)
+            self._class_codes[label] = code
+        return code
+
+    def _reserve(self, n):
+        if n <= len(self._matrix):
+            return
+        capacity = max(n, 2 * len(self._matrix), 64)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        codes = np.zeros(capacity, dtype=np.int32)
+        matrix[:self._size] = self._matrix[:self._size]
+        codes[:self._size] = self._codes[:self._size]
+        self._matrix, self._codes = matrix, codes
+
+    # ---------------- QUERIES ----------------
+    def search(self, queries, k=1):
+        """
+        Top-k cosine search. Returns (distances, row indices), both (n, k),
+        sorted nearest first. Distance is 1 - cosine similarity.
+        """
+        q = l2_normalize(queries)
+        matrix = self.embeddings
+        k = min(k, len(matrix))
+        if k == 0:
+            return np.zeros((len(q), 0), np.float32), np.zeros((len(q), 0), np.int64)
+
+        sims = q @ matrix.T
+        if k < sims.shape[1]:
+            idx = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        else:
+            idx = np.tile(np.arange(sims.shape[1]), (len(q), 1))
+        top = np.take_along_axis(sims, idx, axis=1)
+        order = np.argsort(-top, axis=1)
+        idx = np.take_along_axis(idx, order, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return 1.0 - top, idx
+
+    def centroids(self):
+        """Normalized mean embedding per class, (n_classes, dim)."""
+        cached = self._centroids
+        if cached is not None:
+            return cached
+        codes = self._codes[:self._size]
+        sums = np.zeros((len(self.classes), self.dim), dtype=np.float32)
+        np.add.at(sums, codes, self.embeddings)
+        self._centroids = l2_normalize(sums)
+        return self._centroids
+
+    def classify(self, queries, k=3, mode="knn"):
+        """
+        Resolve a batch of embeddings to labels.
+        Returns (labels, nearest distance, confidence) per query.
+
+        knn:      majority vote of the k nearest embeddings; confidence is the
+                  winning share of the vote (what predict_proba gave for
+                  uniform weights).
+        centroid: nearest class centroid; confidence is always 1.0.
+        """
+        q = l2_normalize(queries)
+        n = len(q)
+        if self._size == 0:
+            return [None] * n, np.ones(n, np.float32), np.zeros(n, np.float32)
+
+        if mode == "centroid":
+            sims = q @ self.centroids().T
+            # Classes emptied by remove() keep their code but have no centroid
+            empty = np.bincount(self._codes[:self._size], minlength=len(self.classes)) == 0
+            sims[:, empty] = -np.inf
+            best = sims.argmax(axis=1)
+            dists = 1.0 - sims[np.arange(n), best]
+            return [self.classes[c] for c in best], dists, np.ones(n, np.float32)
+
+        dists, idx = self.search(q, k)
+        k = idx.shape[1]
+        neighbour_codes = self._codes[idx]
+        votes = np.zeros((n, len(self.classes)), dtype=np.float32)
+        np.add.at(votes, (np.broadcast_to(np.arange(n)[:, None], idx.shape), neighbour_codes), 1)
+
+        # argmax picks the lowest class code on ties
+        best = votes.argmax(axis=1)
+        conf = votes[np.arange(n), best] / k
+        return [self.classes[c] for c in best], dists[:, 0], conf
+
+    # ---------------- PERSISTENCE ----------------
+    def save(self, path=INDEX_PATH):
+        """Write atomically so readers never see a half-written file."""
+        self.version = time.strftime("%Y%m%d-%H%M%S") + f"-{time.time_ns() % 1_000_000_000:09d}"
+        tmp = path + ".tmp.npz"
+        np.savez(tmp,
+                 embeddings=self.embeddings,
+                 codes=self._codes[:self._size],
+                 classes=np.asarray(self.classes, dtype=str),
+                 version=np.asarray(self.version))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        data = np.load(path, allow_pickle=False)
+        embeddings = data["embeddings"]
+        index = cls(dim=embeddings.shape[1])
+        index.classes = [str(c) for c in data["classes"]]
+        index._class_codes = {label: i for i, label in enumerate(index.classes)}
+        index._matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        index._codes = data["codes"].astype(np.int32)
+        index._size = len(embeddings)
+        index.version = str(data["version"]) if "version" in data.files else "unversioned"
+        return index
+
+    @classmethod
+    def from_store(cls, store):
+        """
+        Wrap an EmbeddingStore without copying: the memory-mapped rows are
+        already normalized float32. The first add() moves them into RAM.
+        """
+        matrix, meta = store.load_live()
+        index = cls(dim=store.dim)
+        index._codes = np.array([index._code_for(m["label"]) for m in meta], dtype=np.int32)
+        index._matrix = matrix
+        index._size = len(meta)
+        return index
+
+    @classmethod
+    def from_knn(cls, knn, label_encoder):
+        """Build an index from the legacy joblib KNeighborsClassifier."""
+        embeddings = np.asarray(knn._fit_X, dtype=np.float32)
+        index = cls(dim=embeddings.shape[1])
+        index.add(embeddings, [str(label) for label in label_encoder.inverse_transform(knn._y)])
+        return index
+
+
+class HotReloadingIndex:
+    """
+    Double-buffered handle on the published index file.
+
+    current() returns the active index without taking a lock; at most every
+    check_interval seconds it stats the file, and when a new version has been
+    published it is loaded on a background thread and swapped in with a
+    single reference assignment. Inference in flight keeps using the index
+    it already holds.
+    """
+
+    def __init__(self, path=INDEX_PATH, fallback=None, check_interval=2.0, lazy=False):
+        self.path = path
+        self.fallback = fallback            # builds an index when the file does not exist
+        self.check_interval = check_interval
+        self._active = None                 # (index, file signature, loaded_at)
+        self._next_check = 0.0
+        self._loading = threading.Lock()
+        if not lazy:
+            self.reload()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def current(self):
+        if self._active is None:
+            # Lazy: the first caller loads, concurrent callers wait for it
+            self.reload(blocking=True)
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            if self._signature() != self._active[1] and not self._loading.locked():
+                threading.Thread(target=self.reload, name="index-reload", daemon=True).start()
+        return self._active[0]
+
+    def reload(self, blocking=False):
+        """Load the published index and swap it in. blocking waits for a load already in progress."""
+        if not self._loading.acquire(blocking=blocking):
+            return False
+        try:
+            if blocking and self._active is not None:
+                return True
+            signature = self._signature()
+            if signature is None:
+                if self._active is not None:
+                    return False
+                index = self.fallback() if self.fallback else EmbeddingIndex()
+                index.version = index.version or "fallback"
+            else:
+                try:
+                    index = EmbeddingIndex.load(self.path)
+                except Exception as e:
+                    # Keep serving the old index; retry at the next check
+                    print("❌ Index reload failed:", e)
+                    if self._active is None:
+                        raise
+                    return False
+            self._active = (index, signature, time.time())
+            print(f"🔄 Recognition index {index.version}: {len(index)} embeddings, {len(index.classes)} students")
+            return True
+        finally:
+            self._loading.release()
+
+    @property
+    def loaded(self):
+        return self._active is not None
+
+    def info(self):
+        if self._active is None:
+            return {"version": None, "embeddings": None, "students": None, "loaded_at": None}
+        index, _, loaded_at = self._active
+        return {
+            "version": index.version,
+            "embeddings": len(index),
+            "students": len(index.classes),
+            "loaded_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(loaded_at)),
+        }
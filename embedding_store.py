@@ -0,0 +1,191 @@
+# embedding_store.py
+# Append-only on-disk embedding store.
+#
+#   embeddings/embeddings.f32         raw float32 rows, EMBEDDING_DIM wide
+#   embeddings/embeddings_meta.jsonl  one JSON object per row (label, image, ...)
+#
+# Readers memory-map the matrix, so loading thousands of embeddings is one
+# open() and no unpickling. Rows are stored L2-normalized.
+#
+# Import legacy per-image .pt files once with:
+#   python embedding_store.py --import-pt embeddings/
+# Rows of the legacy joblib KNN are copied in automatically before the first
+# enrollment or rebuild (seed_from_legacy_knn), so they stay recognized.
+import os
+import json
+import argparse
+import threading
+import numpy as np
+
+from embedding_index import EMBEDDING_DIM, l2_normalize
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EMBEDDING_DIR = os.path.join(BASE_DIR, "embeddings")
+
+LEGACY_KNN_PATH = os.path.join(BASE_DIR, "knn_model.joblib")
+LEGACY_ENCODER_PATH = os.path.join(BASE_DIR, "label_encoder.joblib")
+
+MATRIX_FILE = "embeddings.f32"
+META_FILE = "embeddings_meta.jsonl"
+
+
+class EmbeddingStore:
+
+    def __init__(self, root=EMBEDDING_DIR, dim=EMBEDDING_DIM):
+        self.root = root
+        self.dim = dim
+        self.matrix_path = os.path.join(root, MATRIX_FILE)
+        self.meta_path = os.path.join(root, META_FILE)
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # ---------------- READ ----------------
+    def __len__(self):
+        return min(self._matrix_rows(), len(self.metadata()))
+
+    def _matrix_rows(self):
+        if not os.path.exists(self.matrix_path):
+            return 0
+        return os.path.getsize(self.matrix_path) // (4 * self.dim)
+
+    def metadata(self):
+        if not os.path.exists(self.meta_path):
+            return []
+        with open(self.meta_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def load(self):
+        """
+        Return (matrix, metadata). The matrix is a read-only memory map of
+        shape (n, dim); only rows that have both data and metadata are
+        included, so a torn append is ignored.
+        """
+        meta = self.metadata()
+        n = min(self._matrix_rows(), len(meta))
+        if n == 0:
+            return np.zeros((0, self.dim), dtype=np.float32), []
+        matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+        return matrix, meta[:n]
+
+    def labels(self):
+        return [m["label"] for m in self.load()[1]]
+
+    def load_live(self):
+        """
+        Like load(), but when an image was re-embedded after it changed, only
+        its newest row is kept. Zero-copy unless something was superseded.
+        """
+        matrix, meta = self.load()
+        last = {}
+        for row, m in enumerate(meta):
+            if m.get("image"):
+                last[m["image"]] = row
+        live = [row for row, m in enumerate(meta) if not m.get("image") or last[m["image"]] == row]
+        if len(live) == len(meta):
+            return matrix, meta
+        return np.ascontiguousarray(matrix[live]), [meta[row] for row in live]
+
+    def embedded_hashes(self):
+        """Content hashes of every embedded image."""
+        return {m["sha1"] for m in self.metadata() if m.get("sha1")}
+
+    # ---------------- WRITE ----------------
+    def append(self, embeddings, labels, images=None, extra=None):
+        """
+        Append rows. Data is fsynced before its metadata is written, so
+        after a crash every metadata line has a complete row behind it.
+        Returns the row numbers written.
+        """
+        vecs = l2_normalize(embeddings)
+        if vecs.shape[1] != self.dim:
+            raise ValueError(f"expected {self.dim}-d embeddings, got {vecs.shape[1]}")
+        images = images or [None] * len(vecs)
+        extra = extra or [{} for _ in range(len(vecs))]
+
+        with self._lock:
+            start = len(self)
+            # Drop any torn tail left by an interrupted append
+            if os.path.exists(self.matrix_path) and os.path.getsize(self.matrix_path) != start * 4 * self.dim:
+                with open(self.matrix_path, "r+b") as f:
+                    f.truncate(start * 4 * self.dim)
+
+            with open(self.matrix_path, "ab") as f:
+                f.write(vecs.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            with open(self.meta_path, "a", encoding="utf-8") as f:
+                for label, image, more in zip(labels, images, extra):
+                    row = {"label": label, "image": image}
+                    row.update(more)
+                    f.write(json.dumps(row) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+        return list(range(start, start + len(vecs)))
+
+
+def label_from_pt_name(file):
+    # "divy_tank_1.pt" → "divy tank"
+    return " ".join(file.split("_")[:-1]).lower()
+
+
+def import_pt_dir(pt_dir, store):
+    """One-time import of legacy per-image .pt files into the store."""
+    import torch
+
+    vecs, labels, images = [], [], []
+    for file in sorted(os.listdir(pt_dir)):
+        if not file.endswith(".pt"):
+            continue
+        vec = torch.load(os.path.join(pt_dir, file))
+        if isinstance(vec, torch.Tensor):
+            vec = vec.detach().cpu().numpy()
+        vecs.append(np.asarray(vec).flatten())
+        labels.append(label_from_pt_name(file))
+        images.append(file)
+
+    if vecs:
+        store.append(np.array(vecs), labels, images)
+    return len(vecs)
+
+
+def load_legacy_knn(knn_path=LEGACY_KNN_PATH, encoder_path=LEGACY_ENCODER_PATH):
+    """EmbeddingIndex of the joblib KNN trained before the store existed, or None."""
+    if not (os.path.exists(knn_path) and os.path.exists(encoder_path)):
+        return None
+    import joblib
+    from embedding_index import EmbeddingIndex
+    index = EmbeddingIndex.from_knn(joblib.load(knn_path), joblib.load(encoder_path))
+    index.version = "legacy-knn"
+    return index
+
+
+def seed_from_legacy_knn(store, knn_path=LEGACY_KNN_PATH, encoder_path=LEGACY_ENCODER_PATH):
+    """
+    Copy the legacy KNN rows into an empty store. Until then recognition
+    falls back to that KNN, so building the first index from the store
+    alone would drop everyone it knew. Returns how many rows were copied.
+    """
+    if len(store):
+        return 0
+    index = load_legacy_knn(knn_path, encoder_path)
+    if index is None or not len(index):
+        return 0
+    labels = [str(label) for label in index.labels]
+    store.append(index.embeddings, labels, extra=[{"source": "legacy-knn"} for _ in labels])
+    print(f"📥 Copied {len(labels)} legacy KNN embeddings into the store")
+    return len(labels)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--import-pt", metavar="DIR", help="import legacy .pt embeddings from DIR")
+    parser.add_argument("--store", default=EMBEDDING_DIR)
+    args = parser.parse_args()
+
+    store = EmbeddingStore(args.store)
+    if args.import_pt:
+        count = import_pt_dir(args.import_pt, store)
+        print(f"✅ Imported {count} embeddings into {store.matrix_path}")
+    print(f"Store holds {len(store)} embeddings for {len(set(store.labels()))} students")
@@ -0,0 +1,163 @@
+# enrollment.py
+# Incremental enrollment: embed only the images of one student that are not
+# in the embedding store yet (by content hash), append them to the store and
+# add them to the published index without a full retrain.
+import os
+import hashlib
+import threading
+import numpy as np
+from PIL import Image
+
+from embedding_index import EmbeddingIndex, INDEX_PATH
+from embedding_store import EmbeddingStore, seed_from_legacy_knn
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+
+_models = None
+_models_lock = threading.Lock()
+
+
+def student_label(name):
+    # "Divy_Tank " → "divy tank", the label recognize_knn_attendance returns
+    return " ".join(name.strip().lower().replace("_", " ").split())
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def list_images(folder):
+    return sorted(
+        os.path.join(folder, file) for file in os.listdir(folder)
+        if file.lower().endswith(IMAGE_EXTS)
+    )
+
+
+def pending_images(folder, store):
+    """(path, sha1) of images in folder whose content is not embedded yet."""
+    known = store.embedded_hashes()
+    # Rows written before hashes were recorded are matched by path instead
+    legacy_paths = {m["image"] for m in store.metadata() if not m.get("sha1")}
+
+    pending = []
+    for path in list_images(folder):
+        if path in legacy_paths:
+            continue
+        digest = file_sha1(path)
+        if digest not in known:
+            pending.append((path, digest))
+            known.add(digest)   # identical copies in the same folder
+    return pending
+
+
+def embed_images(paths, mtcnn, resnet):
+    """Embed the single face in each image. Returns (embeddings, index of each embedded path)."""
+    import torch    # not at module level: the web app imports this module
+    embeddings, kept = [], []
+    for i, path in enumerate(paths):
+        try:
+            img = Image.open(path).convert("RGB")
+        except Exception as e:
+            print(f"❌ Could not open {os.path.basename(path)}: {e}")
+            continue
+
+        face = mtcnn(img)
+        if face is None:
+            print(f"⚠️ No face detected in {os.path.basename(path)}")
+            continue
+
+        with torch.no_grad():
+            emb = resnet(face.unsqueeze(0))
+        embeddings.append(emb.cpu().numpy().flatten())
+        kept.append(i)
+    return embeddings, kept
+
+
+def publish(store, embeddings, labels, index_path=INDEX_PATH):
+    """Add new rows to the published index, or build it from the store the first time."""
+    if os.path.exists(index_path):
+        index = EmbeddingIndex.load(index_path)
+        if len(embeddings):
+            index.add(np.asarray(embeddings), labels)
+    else:
+        # The store already holds the new rows
+        index = EmbeddingIndex.from_store(store)
+    index.save(index_path)
+    return index
+
+
+def enroll_folder(folder, name, mtcnn, resnet, store=None, index_path=INDEX_PATH):
+    """
+    Embed the new or changed images of one student and publish them.
+    Returns how many embeddings were added.
+
+    The embedding of a changed image supersedes the old row in the store;
+    the published index drops the old row at the next full train_knn.py.
+    """
+    if store is None:
+        store = EmbeddingStore()
+    label = student_label(name)
+    # Before the first append, or the first index would hold this student only
+    seed_from_legacy_knn(store)
+
+    pending = pending_images(folder, store)
+    if not pending:
+        print(f"✔️ {label}: nothing new to embed")
+        return 0
+
+    paths = [p for p, _ in pending]
+    embeddings, kept = embed_images(paths, mtcnn, resnet)
+    if not embeddings:
+        print(f"❌ No valid faces found for {label}")
+        return 0
+
+    store.append(
+        embeddings,
+        [label] * len(embeddings),
+        [paths[i] for i in kept],
+        [{"sha1": pending[i][1]} for i in kept],
+    )
+    publish(store, embeddings, [label] * len(embeddings), index_path)
+    print(f"💾 Enrolled {len(embeddings)} new embeddings for {label}")
+    return len(embeddings)
+
+
+def rebuild_index(store=None, index_path=INDEX_PATH):
+    """Full rebuild of the published index from the store (what train_knn.py does)."""
+    if store is None:
+        store = EmbeddingStore()
+    seed_from_legacy_knn(store)
+    index = EmbeddingIndex.from_store(store)
+    index.save(index_path)
+    return index
+
+
+# ---------------- SERVER JOBS ----------------
+def get_models():
+    """
+    Warm enrollment models for the server process: a single-face MTCNN and
+    the recognizer's already-loaded resnet, created once and reused by
+    every job.
+    """
+    global _models
+    with _models_lock:
+        if _models is None:
+            from facenet_pytorch import MTCNN
+            from recognize_knn_attendance import load_models
+            # Same embedder backend as recognition, so enrolled embeddings match
+            _models = (MTCNN(keep_all=False), load_models()[1])
+        return _models
+
+
+def enroll_job(job, folder, name):
+    mtcnn, resnet = get_models()
+    return {"added": enroll_folder(folder, name, mtcnn, resnet)}
+
+
+def rebuild_job(job):
+    index = rebuild_index()
+    return {"version": index.version, "embeddings": len(index)}
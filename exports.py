@@ -0,0 +1,123 @@
+# exports.py
+# Streaming attendance exports. Rows come from a server-side cursor
+# (yield_per) and are written out as they arrive, so exporting a whole term
+# for the whole school never holds the result set in memory.
+#
+# CSV is streamed to the client row by row. XLSX is a zip archive that can
+# only be finished once every row is in: openpyxl's write-only mode spills
+# rows to disk, the workbook is assembled in an anonymous temporary file
+# (deleted on close, never in the working directory) and then streamed.
+import io
+import csv
+import tempfile
+from openpyxl import Workbook
+
+from models import db, Student, Attendance
+import metrics
+
+YIELD_PER = 1000              # rows fetched from the cursor at a time
+CSV_FLUSH_ROWS = 500          # rows per streamed CSV chunk
+CHUNK_SIZE = 64 * 1024        # bytes per streamed XLSX chunk
+
+EXPORTS = metrics.counter("exports_total", "Attendance exports streamed", ["format"])
+EXPORT_ROWS = metrics.counter("export_rows_total", "Rows written to attendance exports", ["format"])
+EXPORT_SECONDS = metrics.histogram("export_seconds", "Time to stream one export", ["format"],
+                                   buckets=(0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300))
+
+MIMETYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def attendance_rows(start, end, student_ids=None, roll_prefix=None):
+    """
+    (date, day_of_week, full_name, roll_no, status) for every attendance
+    record between start and end (inclusive), ordered by date then roll no.
+    The school has no class field; a class is selected by roll-number
+    prefix or by an explicit list of student ids.
+    """
+    query = (
+        db.select(Attendance.date, Attendance.day_of_week, Student.full_name,
+                  Student.roll_no, Attendance.status)
+        .join(Student, Attendance.student_id == Student.id)
+        .where(Attendance.date.between(start, end))
+        .order_by(Attendance.date, Student.roll_no)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    if student_ids:
+        query = query.where(Attendance.student_id.in_(student_ids))
+    if roll_prefix:
+        query = query.where(Student.roll_no.startswith(roll_prefix, autoescape=True))
+
+    for row in db.session.execute(query):
+        yield tuple(row)
+
+
+def roster_rows(day):
+    """
+    (full_name, roll_no, status) for every student on one day, ordered by
+    roll no. Students without an attendance row that day are Absent.
+    """
+    query = (
+        db.select(Student.full_name, Student.roll_no, db.func.coalesce(Attendance.status, "Absent"))
+        .outerjoin(Attendance, db.and_(Attendance.student_id == Student.id, Attendance.date == day))
+        .order_by(Student.roll_no)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    for row in db.session.execute(query):
+        yield tuple(row)
+
+
+def stream_csv(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % CSV_FLUSH_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def sheet_title(title):
+    # Sheet titles are limited to 31 characters and a few forbidden symbols
+    return "".join(c for c in title if c not in '[]:*?/\\')[:31] or "Attendance"
+
+
+def stream_xlsx(title, header, rows):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_title(title))
+    ws.append(header)
+    for row in rows:
+        ws.append([str(v) if hasattr(v, "isoformat") else v for v in row])
+
+    with tempfile.TemporaryFile() as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _counted(rows, fmt):
+    n = 0
+    try:
+        for row in rows:
+            n += 1
+            yield row
+    finally:
+        EXPORT_ROWS.inc(n, format=fmt)
+
+
+def stream_export(fmt, title, header, rows):
+    """Byte chunks of an export in the given format ("csv" or "xlsx")."""
+    EXPORTS.inc(format=fmt)
+    rows = _counted(rows, fmt)
+    chunks = stream_csv(header, rows) if fmt == "csv" else stream_xlsx(title, header, rows)
+    with EXPORT_SECONDS.time(format=fmt):
+        yield from chunks
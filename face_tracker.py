@@ -0,0 +1,141 @@
+# face_tracker.py
+# Lightweight IoU tracker for the webcam pipeline.
+# Faces are associated across frames by box overlap, so a face is embedded
+# when its track starts, until its identity is confirmed by a majority of
+# votes, and then only every REVERIFY_EVERY frames. Attendance is marked
+# from confirmed tracks, never from a single frame.
+import threading
+import itertools
+import collections
+import numpy as np
+
+IOU_THRESHOLD = 0.3
+MAX_MISSING_FRAMES = 10
+VOTE_WINDOW = 5
+CONFIRM_VOTES = 3
+REVERIFY_EVERY = 30
+RETRY_EVERY = 5          # unconfirmed tracks with a full vote window
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU of two (n, 4) / (m, 4) box arrays."""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+class Track:
+
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box
+        self.missing = 0
+        self.age = 0                  # frames since the track started
+        self.last_embedded = None     # age at the last embedding
+        self.votes = collections.deque(maxlen=VOTE_WINDOW)   # label or None per embedding
+        self.identity = None          # confirmed label
+        self.distance = None
+        self.confidence = None
+
+    def needs_embedding(self):
+        if self.last_embedded is None:
+            return True
+        since = self.age - self.last_embedded
+        if self.identity is not None:
+            return since >= REVERIFY_EVERY
+        if len(self.votes) < VOTE_WINDOW:
+            return True
+        return since >= RETRY_EVERY
+
+    def record(self, label, distance, confidence):
+        self.last_embedded = self.age
+        self.votes.append(label)
+        self.distance = distance
+        self.confidence = confidence
+
+        counts = collections.Counter(v for v in self.votes if v is not None)
+        if counts:
+            label, n = counts.most_common(1)[0]
+            if n >= CONFIRM_VOTES:
+                self.identity = label
+                return
+        # Lost its majority (e.g. a re-verification disagreed)
+        if self.identity is not None and counts.get(self.identity, 0) < CONFIRM_VOTES:
+            self.identity = None
+
+    @property
+    def resolved(self):
+        """Confirmed, or a full vote window without a majority (unknown)."""
+        return self.identity is not None or len(self.votes) == VOTE_WINDOW
+
+    @property
+    def pending_votes(self):
+        counts = collections.Counter(v for v in self.votes if v is not None)
+        return counts.most_common(1)[0][1] if counts else 0
+
+
+class FaceTracker:
+
+    def __init__(self, iou_threshold=IOU_THRESHOLD, max_missing=MAX_MISSING_FRAMES):
+        self.iou_threshold = iou_threshold
+        self.max_missing = max_missing
+        self.tracks = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._last_seq = -1
+
+    def update(self, boxes, seq=None):
+        """
+        Associate this frame's boxes with tracks (greedy, highest IoU first).
+        Returns (track per box, whether each needs embedding), or None if the
+        frame is older than one already applied (out-of-order worker).
+        """
+        with self._lock:
+            if seq is not None:
+                if seq <= self._last_seq:
+                    return None
+                self._last_seq = seq
+
+            boxes = [tuple(int(v) for v in box) for box in boxes]
+            assigned = [None] * len(boxes)
+            matched = set()
+
+            if self.tracks and boxes:
+                ious = iou_matrix([t.box for t in self.tracks], boxes)
+                for flat in np.argsort(-ious, axis=None):
+                    ti, bi = np.unravel_index(flat, ious.shape)
+                    if ious[ti, bi] < self.iou_threshold:
+                        break
+                    if ti in matched or assigned[bi] is not None:
+                        continue
+                    matched.add(ti)
+                    assigned[bi] = self.tracks[ti]
+
+            for ti, track in enumerate(self.tracks):
+                if ti in matched:
+                    track.missing = 0
+                    track.age += 1
+                else:
+                    track.missing += 1
+
+            for bi, box in enumerate(boxes):
+                if assigned[bi] is None:
+                    assigned[bi] = Track(next(self._ids), box)
+                    self.tracks.append(assigned[bi])
+                else:
+                    assigned[bi].box = box
+
+            self.tracks = [t for t in self.tracks if t.missing <= self.max_missing]
+            return assigned, [t.needs_embedding() for t in assigned]
+
+    def record(self, track, label, distance, confidence):
+        with self._lock:
+            track.record(label, distance, confidence)
@@ -0,0 +1,471 @@
+# frame_pipeline.py
+# Staged camera pipeline: capture -> shared recognition backend -> JPEG encoder.
+# Every camera has its own capture and encode threads; all cameras feed one
+# RecognitionBackend whose workers analyse a frame from each camera in a
+# single batch. Stages are joined by small drop-oldest queues so a slow
+# stage never stalls the others; the preview runs at camera rate and shows
+# the most recent recognition result. Viewers of a camera all read the
+# same encoded frames.
+import os
+import time
+import threading
+import collections
+import cv2
+
+from recognize_knn_attendance import analyze_frames, draw_result, warm_up
+from face_tracker import FaceTracker
+from motion_gate import MotionGate
+import metrics
+
+RECOGNITION_WORKERS = 2
+RECOGNITION_QUEUE_SIZE = 2   # per camera
+MAX_BATCH = 8                # frames (one per camera) analysed together
+ENCODE_QUEUE_SIZE = 2
+JPEG_QUALITY = 80
+TRACKING = True          # embed once per track and mark only confirmed identities
+MOTION_GATING = os.environ.get("MOTION_GATING", "1") != "0"   # skip detection on static / empty frames
+RECONNECT_DELAY = 2.0    # seconds before reopening a dropped network stream
+
+FRAMES_CAPTURED = metrics.counter("camera_frames_captured_total", "Frames read from each camera", ["camera"])
+FRAMES_GATED = metrics.counter("camera_frames_gated_total", "Frames the motion gate kept away from the detector", ["camera"])
+FRAMES_DROPPED = metrics.counter("pipeline_frames_dropped_total", "Frames discarded by a full queue", ["camera", "stage"])
+FRAMES_ANALYZED = metrics.counter("recognition_frames_total", "Frames analysed by the recognition backend", ["camera"])
+FACES = metrics.counter("recognition_faces_total", "Faces in analysed frames, by outcome (known, unknown, pending)",
+                        ["outcome"])
+FACES_PER_FRAME = metrics.histogram("recognition_faces_per_frame", "Faces found per analysed frame",
+                                    buckets=(0, 1, 2, 3, 5, 8, 13))
+BATCH_FRAMES = metrics.histogram("recognition_batch_frames", "Frames per recognition batch",
+                                 buckets=(1, 2, 4, 8, 16))
+BATCH_SECONDS = metrics.histogram("recognition_batch_seconds", "Wall time of one recognition batch")
+STAGE_SECONDS = metrics.histogram("recognition_stage_seconds", "Time per recognition stage in one batch", ["stage"])
+ENCODE_SECONDS = metrics.histogram("camera_encode_seconds", "Overlay and JPEG encode time per frame", ["camera"])
+
+
+def ensure_workers(threads, count, target, name):
+    """
+    Keep count daemon threads running target: the live ones from threads
+    plus replacements for any that died. Returns the new thread list.
+    """
+    threads = [t for t in threads if t.is_alive()]
+    for i in range(len(threads), count):
+        t = threading.Thread(target=target, name=f"{name}-{i}", daemon=True)
+        t.start()
+        threads.append(t)
+    return threads
+
+
+class DropOldestQueue:
+    """Bounded queue that discards the oldest item instead of blocking."""
+
+    def __init__(self, maxsize):
+        self._items = collections.deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        """Queue item; returns True when the oldest item was dropped to make room."""
+        with self._cond:
+            full = len(self._items) == self._items.maxlen
+            if full:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+            return full
+
+    def get(self, timeout=None):
+        """Return the oldest item, or None if nothing arrived within timeout."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class RecognitionBackend:
+    """
+    Recognition workers shared by every camera. Each camera has its own
+    small drop-oldest slot, so a busy camera cannot push out another
+    camera's frames; a worker takes the oldest frame of each waiting camera
+    (round-robin, up to max_batch) and analyses them together.
+    """
+
+    def __init__(self, workers=RECOGNITION_WORKERS, max_batch=MAX_BATCH):
+        self.workers = workers
+        self.max_batch = max_batch
+        self._pending = collections.OrderedDict()    # camera -> deque of (seq, frame)
+        self._cond = threading.Condition()
+        self._threads = []
+        self.batches = 0
+        self.frames = 0
+        self.dropped = 0
+
+    def start(self):
+        with self._cond:
+            self._threads = ensure_workers(self._threads, self.workers, self._run, "recognition")
+        return self
+
+    def submit(self, camera, seq, frame):
+        with self._cond:
+            queue = self._pending.get(camera)
+            if queue is None:
+                queue = self._pending[camera] = collections.deque(maxlen=RECOGNITION_QUEUE_SIZE)
+            if len(queue) == queue.maxlen:
+                self.dropped += 1
+                camera.recognition_dropped += 1
+                FRAMES_DROPPED.inc(camera=camera.id, stage="recognition")
+            queue.append((seq, frame))
+            self._cond.notify()
+
+    def discard(self, camera):
+        with self._cond:
+            self._pending.pop(camera, None)
+
+    def _take_batch(self):
+        with self._cond:
+            if not any(self._pending.values()):
+                self._cond.wait(0.5)
+            batch = []
+            for camera, queue in list(self._pending.items()):
+                if len(batch) == self.max_batch:
+                    break
+                if queue:
+                    seq, frame = queue.popleft()
+                    batch.append((camera, seq, frame))
+                    # Served cameras go to the back of the line
+                    self._pending.move_to_end(camera)
+            return batch
+
+    def _run(self):
+        # The first stream loads the models here, not in a request thread
+        try:
+            print(f"🔥 Recognition engine warm in {warm_up():.1f}s")
+        except Exception as e:
+            print("❌ Recognition warm-up failed:", e)
+
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                continue
+
+            timings = {}
+            started = time.perf_counter()
+            try:
+                results = analyze_frames([(frame, camera.tracker, seq) for camera, seq, frame in batch],
+                                         timings=timings)
+            except Exception as e:
+                print("Recognition error:", e)
+                continue
+
+            BATCH_SECONDS.observe(time.perf_counter() - started)
+            BATCH_FRAMES.observe(len(batch))
+            for stage, ms in timings.items():
+                STAGE_SECONDS.observe(ms / 1000, stage=stage)
+            for (camera, _, _), result in zip(batch, results):
+                FRAMES_ANALYZED.inc(camera=camera.id)
+                if result is not None:
+                    FACES_PER_FRAME.observe(len(result["faces"]))
+                    # Tracks still collecting votes are neither known nor unknown yet
+                    known = len(result["names"])
+                    pending = sum(1 for face in result["faces"] if face.get("pending"))
+                    FACES.inc(known, outcome="known")
+                    FACES.inc(pending, outcome="pending")
+                    FACES.inc(len(result["faces"]) - known - pending, outcome="unknown")
+
+            with self._cond:
+                self.batches += 1
+                self.frames += len(batch)
+            for (camera, seq, _), result in zip(batch, results):
+                # None: overtaken by a newer frame of the same camera in another worker
+                if result is None:
+                    continue
+                # A failed delivery (e.g. "database is locked") must not kill a shared worker
+                try:
+                    camera.deliver(seq, result)
+                except Exception as e:
+                    print(f"❌ Delivering recognition result for camera {camera.id} failed:", e)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "batches": self.batches,
+                "frames": self.frames,
+                "avg_batch": round(self.frames / self.batches, 2) if self.batches else 0.0,
+                "dropped": self.dropped,
+                "queued": sum(len(q) for q in self._pending.values()),
+            }
+
+
+class Camera:
+    """
+    One video source (device index, file path or RTSP/HTTP URL). Capture
+    starts with the first viewer and stops when the last one leaves, so
+    any number of browser tabs share one open device and one encoder.
+    """
+
+    def __init__(self, cam_id, source, backend, on_recognized=None,
+                 tracking=TRACKING, gate=None):
+        self.id = cam_id
+        self.source = source
+        self.backend = backend
+        self.on_recognized = on_recognized
+        self.tracking = tracking
+        self._gate = gate
+
+        self.tracker = None
+        self.gate = None
+        self.encode_queue = None
+        self.recognition_dropped = 0
+
+        self._lock = threading.Lock()        # start / stop / viewer count
+        self._stop = threading.Event()
+        self._stop.set()
+        self._threads = []
+        self._cap = None
+        self.viewers = 0
+
+        # Latest recognition result, tagged with the frame number it came from
+        # so a slow worker cannot overwrite a newer result with an older one.
+        self._result_lock = threading.Lock()
+        self._result = None
+        self._result_seq = -1
+
+        # Latest encoded frame, shared by every viewer
+        self._frame_cond = threading.Condition()
+        self._jpeg = None
+        self._jpeg_seq = 0
+
+    # ---------------- LIFECYCLE ----------------
+    def start(self):
+        with self._lock:
+            self._start_locked()
+        return self
+
+    def stop(self):
+        with self._lock:
+            self._stop_locked()
+
+    def _start_locked(self):
+        if self.running:
+            return
+        self.backend.start()
+        self.tracker = FaceTracker() if self.tracking else None
+        gate = self._gate
+        if gate is None and MOTION_GATING:
+            gate = MotionGate()
+        self.gate = gate
+        self.encode_queue = DropOldestQueue(ENCODE_QUEUE_SIZE)
+        self.recognition_dropped = 0
+        with self._result_lock:
+            self._result, self._result_seq = None, -1
+
+        self._cap = cv2.VideoCapture(self.source)
+        self._stop = threading.Event()
+        self._threads = []
+        self._spawn(self._capture_loop, "capture")
+        self._spawn(self._encode_loop, "encode")
+
+    def _stop_locked(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=2)
+        self._threads = []
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        self.backend.discard(self)
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+
+    @property
+    def running(self):
+        return not self._stop.is_set()
+
+    def _spawn(self, target, name):
+        t = threading.Thread(target=target, name=f"camera-{self.id}-{name}", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def _is_stream(self):
+        return isinstance(self.source, str) and not os.path.isfile(self.source)
+
+    # ---------------- STAGES ----------------
+    def _capture_loop(self):
+        seq = 0
+        # Files are played back at their own frame rate instead of as fast as they decode
+        fps = self._cap.get(cv2.CAP_PROP_FPS) if isinstance(self.source, str) and not self._is_stream() else 0
+        interval = 1.0 / fps if fps and fps > 0 else 0
+        next_at = time.perf_counter()
+
+        while not self._stop.is_set():
+            success, frame = self._cap.read()
+            if not success:
+                if not self._is_stream():
+                    break
+                print(f"⚠️ Camera {self.id}: stream dropped, reconnecting")
+                self._cap.release()
+                if self._stop.wait(RECONNECT_DELAY):
+                    break
+                self._cap = cv2.VideoCapture(self.source)
+                continue
+
+            FRAMES_CAPTURED.inc(camera=self.id)
+            # Gated in capture order; a skipped frame keeps the last result on screen
+            if self.gate is None or self.gate.should_process(frame):
+                self.backend.submit(self, seq, frame)
+            else:
+                FRAMES_GATED.inc(camera=self.id)
+            if self.encode_queue.put(frame):
+                FRAMES_DROPPED.inc(camera=self.id, stage="encode")
+            seq += 1
+
+            if interval:
+                next_at += interval
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    self._stop.wait(delay)
+        self._stop.set()
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+
+    def deliver(self, seq, result):
+        """Called by the recognition backend with the result for frame seq."""
+        with self._result_lock:
+            if seq > self._result_seq:
+                self._result_seq = seq
+                self._result = result
+
+        if self.on_recognized:
+            for name in result["names"]:
+                self.on_recognized(name, self.id)
+
+    def _encode_loop(self):
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY]
+        while not self._stop.is_set():
+            frame = self.encode_queue.get(timeout=0.1)
+            if frame is None:
+                continue
+
+            started = time.perf_counter()
+            with self._result_lock:
+                result = self._result
+            if result is not None:
+                # Copy: the same frame may still be read by a recognition worker
+                frame = draw_result(frame.copy(), result)
+
+            ret, buffer = cv2.imencode('.jpg', frame, params)
+            ENCODE_SECONDS.observe(time.perf_counter() - started, camera=self.id)
+            if ret:
+                with self._frame_cond:
+                    self._jpeg = buffer.tobytes()
+                    self._jpeg_seq += 1
+                    self._frame_cond.notify_all()
+
+    def stats(self):
+        return {
+            "source": str(self.source),
+            "running": self.running,
+            "viewers": self.viewers,
+            "recognition_dropped": self.recognition_dropped,
+            "encode_dropped": self.encode_queue.dropped if self.encode_queue else 0,
+            "gate": self.gate.stats() if self.gate else None,
+        }
+
+    # ---------------- OUTPUT ----------------
+    def jpeg_frames(self):
+        """
+        Yield encoded JPEG frames to one viewer until the camera stops.
+        A viewer that falls behind skips to the newest frame.
+        """
+        with self._lock:
+            self.viewers += 1
+            self._start_locked()
+            last = self._jpeg_seq
+        try:
+            while True:
+                with self._frame_cond:
+                    if self._jpeg_seq == last and self.running:
+                        self._frame_cond.wait(0.5)
+                    if self._jpeg_seq == last:
+                        if not self.running:
+                            return
+                        continue
+                    last, jpeg = self._jpeg_seq, self._jpeg
+                yield jpeg
+        finally:
+            with self._lock:
+                self.viewers -= 1
+                if self.viewers == 0:
+                    self._stop_locked()
+
+
+class CameraHub:
+    """Cameras registered by id, all sharing one recognition backend."""
+
+    def __init__(self, on_recognized=None, backend=None):
+        self.on_recognized = on_recognized
+        self.backend = backend or RecognitionBackend()
+        self._cameras = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, cam_id, source, gate=None):
+        """Add or replace a camera. gate: a MotionGate tuned for it (default: one per MOTION_* settings)."""
+        cam_id = str(cam_id)
+        with self._lock:
+            old = self._cameras.get(cam_id)
+            self._cameras[cam_id] = Camera(cam_id, source, self.backend, self.on_recognized, gate=gate)
+        if old is not None:
+            old.stop()
+        return self._cameras[cam_id]
+
+    def unregister(self, cam_id):
+        with self._lock:
+            camera = self._cameras.pop(str(cam_id), None)
+        if camera is not None:
+            camera.stop()
+        return camera is not None
+
+    def get(self, cam_id):
+        return self._cameras.get(str(cam_id))
+
+    @property
+    def default_id(self):
+        return next(iter(self._cameras), None)
+
+    def stop(self, cam_id=None):
+        cameras = [self.get(cam_id)] if cam_id is not None else list(self._cameras.values())
+        for camera in cameras:
+            if camera is not None:
+                camera.stop()
+
+    @property
+    def streaming(self):
+        return any(camera.running for camera in self._cameras.values())
+
+    def stats(self):
+        return {
+            "streaming": self.streaming,
+            "cameras": {cam_id: camera.stats() for cam_id, camera in list(self._cameras.items())},
+            "backend": self.backend.stats(),
+        }
+
+
+def parse_sources(spec):
+    """
+    "entrance=0,gate=rtsp://10.0.0.5/stream" -> {"entrance": 0, "gate": "rtsp://..."}.
+    Bare entries are numbered by position; digits are device indexes.
+    """
+    sources = collections.OrderedDict()
+    for i, entry in enumerate(e.strip() for e in spec.split(",")):
+        if not entry:
+            continue
+        cam_id, sep, source = entry.partition("=")
+        if not sep or "://" in cam_id:
+            cam_id, source = str(i), entry
+        source = source.strip()
+        sources[cam_id.strip()] = int(source) if source.isdigit() else source
+    return sources
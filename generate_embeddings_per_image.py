@@ -1,66 +1,82 @@
 # generate_embeddings_per_image.py
-from facenet_pytorch import MTCNN, InceptionResnetV1
-from PIL import Image
-import torch
+# Embeds student images into the embedding store and publishes them to the
+# recognition index. Only images whose content is not embedded yet are
+# processed, so re-running is cheap.
+#
+#   python generate_embeddings_per_image.py --input student_images/Divy_Tank --name "Divy Tank"
+#   python generate_embeddings_per_image.py            # every student folder
+#   python generate_embeddings_per_image.py --bulk --workers 8 --batch-size 64 --threads 4
+#   python generate_embeddings_per_image.py --bulk --archive /mnt/archive   # another archive root
+from facenet_pytorch import MTCNN
 import os
+import argparse
+from embedding_store import EmbeddingStore, EMBEDDING_DIR
+from embedders import EMBEDDERS, EMBEDDER_BACKEND, build_embedder, load_resnet
+from enrollment import enroll_folder
+from bulk_embedding import run_bulk
 
 # -----------------------------
 # Paths
 # -----------------------------
-DATASET_PATH = r"C:\Users\HP\OneDrive\cvproject\student_images"
-EMBEDDING_DIR = r"C:\Users\HP\OneDrive\cvproject\embeddings"
-os.makedirs(EMBEDDING_DIR, exist_ok=True)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(BASE_DIR, "student_images")
 
-# -----------------------------
-# Models
-# -----------------------------
-mtcnn = MTCNN(keep_all=False)
-resnet = InceptionResnetV1(pretrained='vggface2').eval()
-
-# -----------------------------
-# Process Each Student Folder
-# -----------------------------
-for student_name in os.listdir(DATASET_PATH):
-
-    student_folder = os.path.join(DATASET_PATH, student_name)
-    if not os.path.isdir(student_folder):
-        continue
-
-    # ✅ FIX: Use full folder name as student label (Full Name)
-    student_label = student_name.strip().lower().replace(" ", "_")
-
-    print(f"\n👩‍🎓 Processing student: {student_name}")
 
-    image_count = 0
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", help="a single student's image folder (not with --bulk)")
+    parser.add_argument("--archive", default=DATASET_PATH,
+                        help="archive root with one folder per student, used when --input is not given")
+    parser.add_argument("--name", help="student full name (defaults to the folder name)")
+    parser.add_argument("--out", default=EMBEDDING_DIR, help="embedding store directory")
+    parser.add_argument("--bulk", action="store_true", help="parallel decode + batched inference over the whole archive")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=None, help="decode processes (default: cores - 1)")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--max-side", type=int, default=640, help="bulk mode: images are letterboxed to this size")
+    parser.add_argument("--backend", default=EMBEDDER_BACKEND, choices=list(EMBEDDERS),
+                        help="embedder backend; use the same one the recognizer runs")
+    args = parser.parse_args()
+    if args.bulk and args.input:
+        parser.error("--bulk embeds a whole archive; pass its root with --archive, not --input")
 
-    for file in os.listdir(student_folder):
-        if file.lower().endswith(('.jpg', '.jpeg', '.png')):
-            img_path = os.path.join(student_folder, file)
+    store = EmbeddingStore(args.out)
 
-            try:
-                img = Image.open(img_path)
-            except Exception as e:
-                print(f"❌ Could not open {file}: {e}")
-                continue
+    # -----------------------------
+    # Models
+    # -----------------------------
+    mtcnn = MTCNN(keep_all=False)
+    resnet = build_embedder(load_resnet(), args.backend, args.threads)
 
-            face = mtcnn(img)
-            if face is not None:
-                emb = resnet(face.unsqueeze(0))
+    # -----------------------------
+    # Bulk mode: the whole archive, resumable
+    # -----------------------------
+    if args.bulk:
+        run_bulk(args.archive, store, mtcnn, resnet,
+                 batch_size=args.batch_size, workers=args.workers,
+                 threads=args.threads, max_side=args.max_side)
+        return
 
-                image_count += 1
+    # -----------------------------
+    # Process one folder, or every student folder
+    # -----------------------------
+    if args.input:
+        folders = [(args.input, args.name or os.path.basename(os.path.normpath(args.input)))]
+    else:
+        folders = [
+            (os.path.join(args.archive, name), name)
+            for name in os.listdir(args.archive)
+            if os.path.isdir(os.path.join(args.archive, name))
+        ]
 
-                # ✅ Save embedding with student's FULL NAME
-                save_path = os.path.join(
-                    EMBEDDING_DIR,
-                    f"{student_label}_{image_count}.pt"
-                )
-                torch.save(emb, save_path)
-                print(f"✅ Saved {save_path}")
+    total = 0
+    for folder, student_name in folders:
+        print(f"\n👩‍🎓 Processing student: {student_name}")
+        total += enroll_folder(folder, student_name, mtcnn, resnet, store=store)
 
-            else:
-                print(f"⚠️ No face detected in {file}")
+    print(f"\n🎯 Done, {total} new embeddings.")
 
-    if image_count == 0:
-        print(f"❌ No valid faces found for {student_name}")
 
-print("\n🎯 All students processed successfully!")
+# Guarded: bulk mode's process pool re-imports this module on Windows
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import os
-import torch
 from app import app
 from models import db, Student, FaceEmbedding
+from embedding_store import EmbeddingStore
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 STUDENT_IMAGE_DIR = os.path.join(BASE_DIR, "student_images")
@@ -11,6 +11,9 @@ with app.app_context():
 
     print("\n🔍 Scanning student folders...\n")
 
+    store = EmbeddingStore(EMBED_DIR)
+    store_meta = store.metadata()
+
     for folder in os.listdir(STUDENT_IMAGE_DIR):
         folder_path = os.path.join(STUDENT_IMAGE_DIR, folder)
 
@@ -32,30 +35,33 @@ with app.app_context():
         else:
             print(f"   ⚠️ Student already exists → Skipping insert")
 
-        # Insert embeddings
+        # Insert embeddings: one FaceEmbedding per store row, path "<matrix>#<row>"
+        label = " ".join(roll.lower().replace("_", " ").split())
         count = 0
-        for file in os.listdir(EMBED_DIR):
-            if file.startswith(roll) and file.endswith(".pt"):
-
-                emb_path = os.path.join(EMBED_DIR, file)
-
-                exists = FaceEmbedding.query.filter_by(
-                    student_id=student.id,
-                    file_name=file
-                ).first()
-
-                if exists:
-                    continue
-
-                # Register embedding
-                rec = FaceEmbedding(
-                    student_id=student.id,
-                    file_name=file,
-                    embedding_path=emb_path
-                )
-
-                db.session.add(rec)
-                count += 1
+        for row, meta in enumerate(store_meta):
+            if meta["label"] != label:
+                continue
+
+            file = os.path.basename(meta["image"] or f"row_{row}")
+            emb_path = f"{store.matrix_path}#{row}"
+
+            exists = FaceEmbedding.query.filter_by(
+                student_id=student.id,
+                embedding_path=emb_path
+            ).first()
+
+            if exists:
+                continue
+
+            # Register embedding
+            rec = FaceEmbedding(
+                student_id=student.id,
+                file_name=file,
+                embedding_path=emb_path
+            )
+
+            db.session.add(rec)
+            count += 1
 
         db.session.commit()
         print(f"   ➕ Saved {count} embeddings\n")
@@ -0,0 +1,134 @@
+# jobs.py
+# In-process background job queue for enrollment and index rebuilds.
+# A single worker thread runs jobs in order, so models stay loaded between
+# jobs and nothing races on the embedding store or the published index.
+# Pending jobs with the same key are coalesced into one.
+#
+# Long jobs that touch neither (monthly notifications) are submitted to
+# their own lane, which has its own worker, so they never hold up
+# enrollment behind them.
+import threading
+import collections
+import itertools
+import time
+import traceback
+import metrics
+
+MAX_FINISHED_JOBS = 200
+DEFAULT_LANE = "default"
+
+JOBS = metrics.counter("jobs_total", "Finished background jobs", ["kind", "status"])
+JOB_SECONDS = metrics.histogram("job_seconds", "Run time of background jobs", ["kind"],
+                                buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600))
+
+
+class Job:
+
+    def __init__(self, job_id, kind, target, args, key):
+        self.id = job_id
+        self.kind = kind
+        self.key = key
+        self.target = target
+        self.args = args
+        self.status = "queued"
+        self.progress = None        # optional {"done": n, "total": m} set by the target
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def set_progress(self, done, total):
+        self.progress = {"done": done, "total": total}
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class JobQueue:
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = {}              # lane -> deque of jobs
+        self._pending_by_key = {}
+        self._jobs = {}
+        self._finished = collections.deque()
+        self._ids = itertools.count(1)
+        self._threads = {}              # lane -> worker thread
+
+    def submit(self, kind, target, *args, key=None, lane=DEFAULT_LANE):
+        """
+        Queue target(job, *args) on a lane; each lane runs its jobs in
+        order on its own worker. If a job with the same key is still
+        queued, that job is returned instead of adding another.
+        """
+        with self._cond:
+            if key is not None and key in self._pending_by_key:
+                return self._pending_by_key[key]
+
+            job = Job(next(self._ids), kind, target, args, key)
+            self._jobs[job.id] = job
+            self._pending.setdefault(lane, collections.deque()).append(job)
+            if key is not None:
+                self._pending_by_key[key] = job
+            self._ensure_worker(lane)
+            self._cond.notify_all()
+            return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self):
+        with self._cond:
+            return sorted(self._jobs.values(), key=lambda j: j.id, reverse=True)
+
+    def depth(self):
+        return sum(len(pending) for pending in self._pending.values())
+
+    def _ensure_worker(self, lane):
+        thread = self._threads.get(lane)
+        if thread is None or not thread.is_alive():
+            name = "job-worker" if lane == DEFAULT_LANE else f"job-worker-{lane}"
+            self._threads[lane] = threading.Thread(target=self._run, args=(lane,), name=name, daemon=True)
+            self._threads[lane].start()
+
+    def _run(self, lane):
+        pending = self._pending[lane]
+        while True:
+            with self._cond:
+                while not pending:
+                    self._cond.wait()
+                job = pending.popleft()
+                if job.key is not None:
+                    self._pending_by_key.pop(job.key, None)
+                job.status = "running"
+                job.started = time.time()
+
+            try:
+                job.result = job.target(job, *job.args)
+                job.status = "done"
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                traceback.print_exc()
+            job.finished = time.time()
+            JOBS.inc(kind=job.kind, status=job.status)
+            JOB_SECONDS.observe(job.finished - job.started, kind=job.kind)
+
+            with self._cond:
+                self._finished.append(job.id)
+                while len(self._finished) > MAX_FINISHED_JOBS:
+                    self._jobs.pop(self._finished.popleft(), None)
+
+
+job_queue = JobQueue()
@@ -0,0 +1,85 @@
+# measure_startup.py
+# Measures what `from app import app` costs -- wall time, peak RSS and
+# whether torch got imported -- in a fresh interpreter, and optionally the
+# warm_up() that follows on the first stream. Exits non-zero when a budget
+# is exceeded, so it can guard against heavy imports creeping back in.
+#
+#   python measure_startup.py
+#   python measure_startup.py --warm --runs 5 --max-seconds 2 --max-rss-mb 250
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in the child interpreter
+PROBE = r"""
+import sys, time, json
+started = time.perf_counter()
+from app import app
+result = {"import_seconds": time.perf_counter() - started,
+          "torch_imported": "torch" in sys.modules,
+          "sklearn_imported": "sklearn" in sys.modules}
+
+from bench_recognition import peak_rss_mb
+result["import_rss_mb"] = peak_rss_mb()
+if WARM:
+    from recognize_knn_attendance import warm_up
+    result["warm_up_seconds"] = warm_up()
+    result["warm_rss_mb"] = peak_rss_mb()
+print("RESULT " + json.dumps(result))
+"""
+
+
+def measure_once(warm):
+    # Importing the app creates and migrates its database: use a scratch one
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(os.environ, ATTENDANCE_DATABASE_URI="sqlite:///" + os.path.join(scratch, "attendance.db"))
+        proc = subprocess.run(
+            [sys.executable, "-c", f"WARM = {warm!r}\n" + PROBE],
+            cwd=BASE_DIR, env=env, capture_output=True, text=True,
+        )
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"probe failed:\n{proc.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--warm", action="store_true", help="also time warm_up() (loads torch and the models)")
+    parser.add_argument("--max-seconds", type=float, default=None, help="fail if the median import takes longer")
+    parser.add_argument("--max-rss-mb", type=float, default=None, help="fail if import-time peak RSS is higher")
+    args = parser.parse_args()
+
+    runs = [measure_once(args.warm) for _ in range(args.runs)]
+    import_s = statistics.median(r["import_seconds"] for r in runs)
+    rss = max((r["import_rss_mb"] or 0) for r in runs)
+
+    print(f"⏱️ import app: {import_s:.2f}s median of {args.runs}, peak RSS {rss:.0f} MB")
+    print(f"   torch imported: {runs[0]['torch_imported']}, sklearn imported: {runs[0]['sklearn_imported']}")
+    if args.warm:
+        warm_s = statistics.median(r["warm_up_seconds"] for r in runs)
+        warm_rss = max((r["warm_rss_mb"] or 0) for r in runs)
+        print(f"🔥 warm_up(): {warm_s:.2f}s, peak RSS after warm-up {warm_rss:.0f} MB")
+
+    failures = []
+    if runs[0]["torch_imported"]:
+        failures.append("importing the app imported torch")
+    if args.max_seconds is not None and import_s > args.max_seconds:
+        failures.append(f"import took {import_s:.2f}s (budget {args.max_seconds}s)")
+    if args.max_rss_mb is not None and rss > args.max_rss_mb:
+        failures.append(f"import peak RSS {rss:.0f} MB (budget {args.max_rss_mb} MB)")
+
+    for failure in failures:
+        print("❌", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -42,5 +42,15 @@ class Attendance(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     source = db.Column(db.String(50))     # webcam / manual
 
+    __table_args__ = (
+        # One row per student per day; also serves (student_id, date range) lookups
+        db.Index("uq_attendance_student_date", "student_id", "date", unique=True),
+        db.Index("ix_attendance_date_status", "date", "status"),
+    )
+
     def __repr__(self):
         return f"<Attendance {self.student_id} {self.date}>"
+
+
+# mark_attendance matches recognized names case-insensitively
+db.Index("ix_student_full_name_lower", db.func.lower(Student.full_name))
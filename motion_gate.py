@@ -0,0 +1,70 @@
+# motion_gate.py
+# Cheap pre-filter in front of the face detector. Consecutive frames are
+# compared as small blurred grayscale images; when almost nothing changed
+# the frame is skipped and the previous recognition result stays on screen.
+# An idle kiosk then costs a resize per frame instead of an MTCNN pass.
+#
+# Thresholds can be tuned per deployment with MOTION_PIXEL_THRESHOLD,
+# MOTION_RATIO and MOTION_FORCE_EVERY; MOTION_GATING=0 turns the gate off.
+import os
+import threading
+import cv2
+
+GATE_WIDTH = 160             # frames are compared at this width
+# per-pixel grey-level change that counts as motion
+PIXEL_THRESHOLD = int(os.environ.get("MOTION_PIXEL_THRESHOLD", "25"))
+# fraction of changed pixels that triggers detection
+MOTION_RATIO = float(os.environ.get("MOTION_RATIO", "0.01"))
+# still run detection every this many frames, even when static
+FORCE_EVERY = int(os.environ.get("MOTION_FORCE_EVERY", "150"))
+
+
+class MotionGate:
+
+    def __init__(self, width=GATE_WIDTH, pixel_threshold=PIXEL_THRESHOLD,
+                 motion_ratio=MOTION_RATIO, force_every=FORCE_EVERY):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.motion_ratio = motion_ratio
+        self.force_every = force_every
+
+        self._prev = None
+        self._since_processed = 0
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.skipped = 0
+
+    def _small(self, frame):
+        h, w = frame.shape[:2]
+        size = (self.width, max(1, int(h * self.width / w)))
+        gray = cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def should_process(self, frame):
+        """True when the frame differs enough from the previous one to run detection."""
+        small = self._small(frame)
+        with self._lock:
+            prev, self._prev = self._prev, small
+            if prev is None or prev.shape != small.shape:
+                moved = True
+            else:
+                diff = cv2.absdiff(prev, small)
+                changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1])
+                moved = changed >= self.motion_ratio * small.size
+
+            if moved or self._since_processed >= self.force_every:
+                self._since_processed = 0
+                self.processed += 1
+                return True
+
+            self._since_processed += 1
+            self.skipped += 1
+            return False
+
+    def stats(self):
+        total = self.processed + self.skipped
+        return {
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skipped / total, 3) if total else 0.0,
+        }
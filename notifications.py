@@ -0,0 +1,233 @@
+# notifications.py
+# Monthly attendance notifications, run as a background job.
+#
+# Every student's percentage comes from one GROUP BY, their daily records
+# from one ordered query. Reports are rendered and sent by a thread pool
+# through a pluggable transport: "file" writes .eml files to an outbox
+# folder, "smtp" delivers to an SMTP server (a local stub such as
+# `python -m aiosmtpd -n -l localhost:1025` for testing). A workbook takes
+# about 10 ms to render, so the threads mostly overlap transport I/O; the
+# job runs on its own job-queue lane so it never holds up enrollment.
+import io
+import os
+import smtplib
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from email.message import EmailMessage
+from openpyxl import Workbook
+
+from models import db, Student, Attendance
+from reports import month_bounds, student_status_counts, weekday_count
+from exports import sheet_title
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTBOX_DIR = os.environ.get("NOTIFY_OUTBOX_DIR", os.path.join(BASE_DIR, "outbox"))
+NOTIFY_WORKERS = 4
+NOTIFY_TRANSPORT = os.environ.get("NOTIFY_TRANSPORT", "file")
+
+SMTP_HOST = os.environ.get("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "1025"))
+SMTP_SENDER = os.environ.get("SMTP_SENDER", "attendance@localhost")
+SMTP_USER = os.environ.get("SMTP_USER")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD")
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS") == "1"
+
+XLSX_MIMETYPE = ("application", "vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+
+# ---------------- TRANSPORTS ----------------
+class FileTransport:
+    """Writes every message to <outbox>/<YYYY-MM>/<roll_no>.eml."""
+
+    def __init__(self, outbox=None):
+        # Read at construction, so OUTBOX_DIR can be changed after import
+        self.outbox = outbox or OUTBOX_DIR
+
+    def send(self, message, report):
+        folder = os.path.join(self.outbox, report["period"])
+        os.makedirs(folder, exist_ok=True)
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in report["roll_no"])
+        with open(os.path.join(folder, f"{safe}.eml"), "wb") as f:
+            f.write(message.as_bytes())
+
+    def close(self):
+        pass
+
+
+class SmtpTransport:
+    """Sends over SMTP; each worker thread keeps one connection open."""
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, user=SMTP_USER,
+                 password=SMTP_PASSWORD, starttls=SMTP_STARTTLS):
+        self.host, self.port = host, port
+        self.user, self.password = user, password
+        self.starttls = starttls
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = smtplib.SMTP(self.host, self.port, timeout=30)
+            if self.starttls:
+                conn.starttls()
+            if self.user:
+                conn.login(self.user, self.password)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def send(self, message, report):
+        self._connection().send_message(message)
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.quit()
+            except smtplib.SMTPException:
+                pass
+
+
+TRANSPORTS = {
+    "file": FileTransport,
+    "smtp": SmtpTransport,
+}
+
+
+def register_transport(name, factory):
+    """Plug in another transport: factory() returns an object with send(message, report) and close()."""
+    TRANSPORTS[name] = factory
+
+
+def get_transport(name=None):
+    name = name or NOTIFY_TRANSPORT
+    if name not in TRANSPORTS:
+        raise ValueError(f"Unknown notification transport: {name}")
+    return TRANSPORTS[name]()
+
+
+# ---------------- REPORTS ----------------
+def monthly_reports(year, month):
+    """
+    One report dict per student, with their daily records for the month.
+    Yields student by student, so rendering can start before the month is read.
+    """
+    start, end = month_bounds(year, month)
+    school_days = weekday_count(start, end)
+    counts = student_status_counts(start, end)
+    students = db.session.query(Student.id, Student.full_name, Student.roll_no, Student.email).order_by(Student.id).all()
+
+    records = (
+        db.session.query(Attendance.student_id, Attendance.date, Attendance.day_of_week, Attendance.status)
+        .filter(Attendance.date.between(start, end))
+        .order_by(Attendance.student_id, Attendance.date)
+        .yield_per(1000)
+    )
+    by_student = itertools.groupby(records, key=lambda r: r[0])
+    current = next(by_student, None)
+
+    for student_id, full_name, roll_no, email in students:
+        # Both sides are ordered by student id; records of deleted students are skipped
+        while current is not None and current[0] < student_id:
+            current = next(by_student, None)
+        rows = []
+        if current is not None and current[0] == student_id:
+            rows = [(str(d), day, status) for _, d, day, status in current[1]]
+            current = next(by_student, None)
+
+        present = counts.get(student_id, {}).get("present", 0)
+        yield {
+            "student_id": student_id,
+            "full_name": full_name,
+            "roll_no": roll_no,
+            "email": email,
+            "period": f"{year}-{month:02d}",
+            "present": present,
+            "school_days": school_days,
+            "percent": round(present / school_days * 100, 2) if school_days else 0,
+            "records": rows,
+        }
+
+
+def render_workbook(report):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_title(report["full_name"]))
+    ws.append(["Date", "Day", "Status"])
+    for row in report["records"]:
+        ws.append(list(row))
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def build_message(report, sender=SMTP_SENDER):
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = report["email"]
+    message["Subject"] = f"Attendance report {report['period']}"
+    message.set_content(
+        f"Dear {report['full_name']},\n\n"
+        f"Your attendance for {report['period']} is {report['percent']}% "
+        f"({report['present']} of {report['school_days']} school days present).\n"
+        f"The day-by-day record is attached.\n"
+    )
+    message.add_attachment(render_workbook(report), maintype=XLSX_MIMETYPE[0], subtype=XLSX_MIMETYPE[1],
+                           filename=f"{report['full_name']}_attendance_{report['period']}.xlsx")
+    return message
+
+
+def _deliver(transport, report):
+    transport.send(build_message(report), report)
+
+
+# ---------------- JOB ----------------
+def notify_monthly_job(job, app, year, month, transport_name=None, workers=NOTIFY_WORKERS):
+    """Render and send every student's monthly report. Students without an email are skipped."""
+    transport = get_transport(transport_name)
+    sent = skipped = failed = 0
+    errors = []
+
+    with app.app_context():
+        total = db.session.query(db.func.count(Student.id)).scalar()
+        job.set_progress(0, total)
+
+        with ThreadPoolExecutor(workers, thread_name_prefix="notify") as pool:
+            pending = {}
+            try:
+                for report in monthly_reports(year, month):
+                    if not report["email"]:
+                        skipped += 1
+                        continue
+                    pending[pool.submit(_deliver, transport, report)] = report
+
+                    # Bounded: a school's worth of reports is never queued at once
+                    while len(pending) >= workers * 4:
+                        sent, failed = _collect(pending, sent, failed, errors)
+                        job.set_progress(sent + failed + skipped, total)
+
+                while pending:
+                    sent, failed = _collect(pending, sent, failed, errors)
+                    job.set_progress(sent + failed + skipped, total)
+            finally:
+                transport.close()
+
+    print(f"📧 Monthly notifications {year}-{month:02d}: {sent} sent, {skipped} without email, {failed} failed")
+    return {"sent": sent, "skipped": skipped, "failed": failed, "errors": errors[:20]}
+
+
+def _collect(pending, sent, failed, errors):
+    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+    for future in done:
+        report = pending.pop(future)
+        try:
+            future.result()
+            sent += 1
+        except Exception as e:
+            failed += 1
+            errors.append(f"{report['roll_no']}: {e}")
+    return sent, failed
@@ -0,0 +1,165 @@
+# recognition_batcher.py
+# Dynamic batching for the /api/recognize endpoint. Request threads decode
+# their JPEGs and hand the frames to a DynamicBatcher; its workers merge
+# frames from concurrent requests into one analyze_frames() call (one
+# detector pass per frame size, one embedder pass for every face).
+#
+# A batch is closed when it holds max_batch frames or when its oldest frame
+# has waited max_wait seconds, whichever comes first. Under light load a
+# frame waits at most max_wait; under heavy load the workers are busy
+# anyway and every batch they take is already full.
+import os
+import time
+import threading
+import collections
+from concurrent.futures import Future
+
+from recognize_knn_attendance import analyze_frames, warm_up
+from face_tracker import CONFIRM_VOTES
+from frame_pipeline import ensure_workers
+import metrics
+
+API_WORKERS = int(os.environ.get("API_RECOGNITION_WORKERS", "1"))
+API_MAX_BATCH = 16           # frames analysed together
+API_MAX_WAIT = float(os.environ.get("API_BATCH_WAIT_MS", "10")) / 1000
+API_MAX_PENDING = 64         # frames waiting before requests are refused
+API_VOTE_WINDOW = 10.0       # seconds in which CONFIRM_VOTES sightings confirm a student
+
+API_FRAMES = metrics.counter("api_recognition_frames_total", "Frames submitted to /api/recognize", ["outcome"])
+API_BATCH_FRAMES = metrics.histogram("api_recognition_batch_frames", "Frames per API recognition batch",
+                                     buckets=(1, 2, 4, 8, 16, 32))
+API_WAIT_SECONDS = metrics.histogram("api_recognition_wait_seconds", "Time a frame waited for its batch to start")
+API_BATCH_SECONDS = metrics.histogram("api_recognition_batch_seconds", "Wall time of one API recognition batch")
+
+
+class BatcherFull(RuntimeError):
+    """Raised by submit() when accepting the frames would exceed max_pending."""
+
+
+class DynamicBatcher:
+    """
+    Merges frames from concurrent callers into batched analyze_frames()
+    calls. Frames are analysed without a tracker, so every face is
+    detected, embedded and identified on its own.
+    """
+
+    def __init__(self, workers=API_WORKERS, max_batch=API_MAX_BATCH,
+                 max_wait=API_MAX_WAIT, max_pending=API_MAX_PENDING):
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self._pending = collections.deque()      # (enqueued_at, frame, future)
+        self._cond = threading.Condition()
+        self._threads = []
+        self.batches = 0
+        self.frames = 0
+        self.rejected = 0
+
+    def start(self):
+        with self._cond:
+            self._threads = ensure_workers(self._threads, self.workers, self._run, "api-recognition")
+        return self
+
+    def submit(self, frames):
+        """Queue BGR frames; returns one Future per frame resolving to its analyze_frames() result."""
+        self.start()
+        futures = [Future() for _ in frames]
+        now = time.perf_counter()
+        with self._cond:
+            if len(self._pending) + len(frames) > self.max_pending:
+                self.rejected += len(frames)
+                API_FRAMES.inc(len(frames), outcome="rejected")
+                raise BatcherFull(f"{len(self._pending)} frames already waiting")
+            self._pending.extend((now, frame, future) for frame, future in zip(frames, futures))
+            self._cond.notify()
+        API_FRAMES.inc(len(frames), outcome="accepted")
+        return futures
+
+    def recognize(self, frames, timeout=None):
+        """submit() and wait for every result."""
+        return [future.result(timeout) for future in self.submit(frames)]
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # Wait for more frames until the batch is full or the oldest frame is due
+            deadline = self._pending[0][0] + self.max_wait
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+
+    def _run(self):
+        try:
+            print(f"🔥 API recognition engine warm in {warm_up():.1f}s")
+        except Exception as e:
+            print("❌ API recognition warm-up failed:", e)
+
+        while True:
+            batch = self._take_batch()
+            started = time.perf_counter()
+            for enqueued_at, _, _ in batch:
+                API_WAIT_SECONDS.observe(started - enqueued_at)
+            try:
+                results = analyze_frames([(frame, None, 0) for _, frame, _ in batch])
+            except Exception as e:
+                print("API recognition error:", e)
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            API_BATCH_SECONDS.observe(time.perf_counter() - started)
+            API_BATCH_FRAMES.observe(len(batch))
+            with self._cond:
+                self.batches += 1
+                self.frames += len(batch)
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self.batches,
+                "frames": self.frames,
+                "avg_batch": round(self.frames / self.batches, 2) if self.batches else 0.0,
+                "rejected": self.rejected,
+                "queued": len(self._pending),
+            }
+
+
+class SightingVotes:
+    """
+    Confirmation for API sightings, the counterpart of the stream tracker's
+    vote: a student counts as seen by a camera once they were recognized in
+    `votes` separate frames from it within `window` seconds. Frames may
+    come in one request or several.
+    """
+
+    def __init__(self, votes=CONFIRM_VOTES, window=API_VOTE_WINDOW):
+        self.votes = votes
+        self.window = window
+        self._seen = {}                          # (camera, name) -> deque of sighting times
+        self._lock = threading.Lock()
+
+    def record(self, camera, frame_names):
+        """Add one vote per name per frame; returns the names that now have enough votes."""
+        now = time.monotonic()
+        confirmed = set()
+        with self._lock:
+            # Forget stale sightings so the map only holds recent (camera, name) pairs
+            for key in [k for k, seen in self._seen.items() if now - seen[-1] > self.window]:
+                del self._seen[key]
+            for names in frame_names:
+                for name in set(names):
+                    seen = self._seen.setdefault((camera, name), collections.deque(maxlen=self.votes))
+                    seen.append(now)
+                    if len(seen) == self.votes and now - seen[0] <= self.window:
+                        confirmed.add(name)
+        return sorted(confirmed)
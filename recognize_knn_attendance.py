@@ -1,20 +1,81 @@
-from facenet_pytorch import MTCNN, InceptionResnetV1
 from PIL import Image
-import torch
 import cv2
-import joblib
+import os
+import time
+import threading
 import numpy as np
-from sklearn.preprocessing import normalize
+from embedding_index import EmbeddingIndex, HotReloadingIndex, INDEX_PATH, l2_normalize
+from embedding_store import EmbeddingStore, load_legacy_knn
+from face_tracker import CONFIRM_VOTES
 
-# Load ML models
-mtcnn = MTCNN(keep_all=False)
-resnet = InceptionResnetV1(pretrained='vggface2').eval()
-
-knn = joblib.load("knn_model.joblib")
-label_encoder = joblib.load("label_encoder.joblib")
+# torch, the models and the index are loaded on first use (or by warm_up()),
+# so importing this module -- and the Flask app -- stays cheap.
+_models = None
+_models_lock = threading.Lock()
 
 UNKNOWN_DISTANCE_THRESHOLD = 0.30
 PROBABILITY_THRESHOLD = 1.00
+MULTI_FACE = True
+# MTCNN can run on a downscaled copy (crops still come from the full frame).
+# MTCNN's min_face_size is 20px, so at scale s faces smaller than about 20/s px
+# in the full frame are no longer found (0.5: ~40px). Measure with
+# bench_detection_scale.py before lowering it.
+DETECTION_SCALE = float(os.environ.get("DETECTION_SCALE", "1.0"))
+N_NEIGHBORS = 3
+INDEX_MODE = "knn"        # "knn" (vote of N_NEIGHBORS) or "centroid" (nearest class mean)
+
+
+def load_models():
+    """(mtcnn, embedder), built once on first use. The embedder backend is set by EMBEDDER_BACKEND."""
+    global _models
+    if _models is None:
+        with _models_lock:
+            if _models is None:
+                from facenet_pytorch import MTCNN
+                from embedders import build_embedder, load_resnet
+                # keep_all=True so every face in the frame is returned; single-face mode
+                # just keeps the largest one (select_largest sorts boxes by size).
+                _models = (MTCNN(keep_all=True), build_embedder(load_resnet()))
+    return _models
+
+
+def load_untrained_index():
+    # Not trained yet: memory-map the embedding store directly
+    store = EmbeddingStore()
+    if len(store):
+        return EmbeddingIndex.from_store(store)
+    # Deployments trained before the index existed still have the joblib KNN
+    index = load_legacy_knn()
+    if index is None:
+        raise FileNotFoundError("No embedding index, embedding store or legacy KNN model to recognize with")
+    return index
+
+
+# Picks up indexes published by enrollment / train_knn.py between frames
+index = HotReloadingIndex(INDEX_PATH, fallback=load_untrained_index, lazy=True)
+
+
+def model_info():
+    """Version and size of the index currently used for recognition."""
+    return dict(index.info(), models_loaded=_models is not None)
+
+
+def warm_up():
+    """
+    Load the models and the index and push one dummy frame through them,
+    so the first real frame does not pay for it. Returns the seconds spent.
+    """
+    import torch
+    started = time.perf_counter()
+    mtcnn, embedder = load_models()
+    index.current()
+    mtcnn.detect(Image.new("RGB", (320, 240)))
+    embedder(torch.zeros(1, 3, 160, 160))
+    return time.perf_counter() - started
+
+
+def warmup_job(job):
+    return {"seconds": round(warm_up(), 2)}
 
 # Helper: Normalize predicted name to match DB
 
@@ -24,49 +85,198 @@ def normalize_name(name):
     name = " ".join(name.split())        # remove extra double spaces
     return name.title()                  # capitalize like DB records
 
-# FUNCTION CALLED FROM FLASK /video_feed
-def recognize_frame(frame):
 
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    img = Image.fromarray(rgb)
+# ---------------- BATCHED ENGINE ----------------
+def _downscale(img, scale):
+    if scale == 1.0:
+        return img
+    return img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.BILINEAR)
+
+
+def _boxes(boxes, scale, multi_face):
+    if boxes is None:
+        return np.zeros((0, 4), dtype=np.float32)
+    boxes = np.asarray(boxes, dtype=np.float32) / scale
+    return boxes if multi_face else boxes[:1]
+
+
+def detect_faces_batch(imgs, multi_face=MULTI_FACE, scale=None):
+    """
+    detect_faces() for several PIL images; images of the same size (frames
+    of one camera model) share a single MTCNN pass.
+    """
+    scale = DETECTION_SCALE if scale is None else scale
+    by_size = {}
+    for i, img in enumerate(imgs):
+        by_size.setdefault(img.size, []).append(i)
+
+    out = [None] * len(imgs)
+    for idx in by_size.values():
+        batch_boxes, _ = load_models()[0].detect([_downscale(imgs[i], scale) for i in idx])
+        for i, boxes in zip(idx, batch_boxes):
+            out[i] = _boxes(boxes, scale, multi_face)
+    return out
+
+
+def detect_faces(img, multi_face=MULTI_FACE, scale=None):
+    """
+    Return an (n, 4) array of face boxes in the PIL image (may be empty).
+    Detection runs on a copy downscaled by `scale`; boxes are mapped back
+    to full-resolution coordinates.
+    """
+    return detect_faces_batch([img], multi_face, scale)[0]
+
+
+def embed_crops(crops):
+    """Embed a list of (n, 3, 160, 160) crop tensors in one resnet forward pass."""
+    import torch
+    embs = load_models()[1](torch.cat(crops)).cpu().numpy()
+    return l2_normalize(embs)
 
-    face = mtcnn(img)
 
-    recognized_name = None   # Flask will read this
-    debug_text = ""
+def embed_faces(img, boxes):
+    """Crop every box from the full-resolution image and embed all crops in one resnet forward pass."""
+    return embed_crops([load_models()[0].extract(img, boxes, None)])
 
-    if face is not None:
 
-        emb = resnet(face.unsqueeze(0)).detach().cpu().numpy().flatten().reshape(1, -1)
-        emb_norm = normalize(emb, norm="l2")
+def identify(emb_norm):
+    """Resolve all embeddings with one matrix multiply against the index."""
+    return index.current().classify(emb_norm, k=N_NEIGHBORS, mode=INDEX_MODE)
 
-        distances, idxs = knn.kneighbors(emb_norm, n_neighbors=1)
-        dist = float(distances[0][0])
 
-        probs = knn.predict_proba(emb_norm)[0]
-        best_idx = np.argmax(probs)
-        conf = float(probs[best_idx])
+def _is_known(name_raw, dist, conf):
+    # Unknown logic
+    return name_raw is not None and dist <= UNKNOWN_DISTANCE_THRESHOLD and conf >= PROBABILITY_THRESHOLD
 
-        predicted_name_raw = label_encoder.inverse_transform([best_idx])[0]
 
+def _face(box, name_raw, dist, conf):
+    dist, conf = float(dist), float(conf)
+    face = {"box": tuple(int(v) for v in box), "distance": dist, "confidence": conf}
+    if not _is_known(name_raw, dist, conf):
+        face.update(name=None, text=f"UNKNOWN (d={dist:.2f}, c={conf:.2f})", color=(0, 0, 255))
+    else:
         # FIX: Normalize so DB can match it correctly
-        predicted_name = normalize_name(predicted_name_raw)
+        face.update(name=name_raw, text=f"{normalize_name(name_raw)} (d={dist:.2f}, c={conf:.2f})", color=(0, 255, 0))
+    return face
+
+
+def _track_face(track):
+    face = {"box": track.box, "distance": track.distance, "confidence": track.confidence,
+            "track": track.id, "name": track.identity, "pending": not track.resolved}
+    if track.identity is not None:
+        face.update(text=f"{normalize_name(track.identity)} #{track.id}", color=(0, 255, 0))
+    elif not track.resolved:
+        # Still collecting votes: drawn and counted as pending, not unknown
+        face.update(text=f"Verifying {track.pending_votes}/{CONFIRM_VOTES} #{track.id}", color=(0, 255, 255))
+    else:
+        face.update(text=f"UNKNOWN #{track.id}", color=(0, 0, 255))
+    return face
+
+
+def _lap(timings, stage, started):
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + (now - started) * 1000
+    return now
 
-        # Unknown logic
-        if dist > UNKNOWN_DISTANCE_THRESHOLD or conf < PROBABILITY_THRESHOLD:
-            debug_text = f"UNKNOWN (d={dist:.2f}, c={conf:.2f})"
-            color = (0, 0, 255)
+
+def analyze_frames(items, multi_face=MULTI_FACE, timings=None):
+    """
+    Analyse frames from several cameras at once. items is a list of
+    (frame, tracker or None, seq); frames should come from different
+    trackers. Detection is batched per frame size and every face that
+    needs embedding goes through a single resnet pass.
+
+    With a tracker, only faces whose track needs it (new, unconfirmed, or
+    due for re-verification) are embedded, and the result is None when
+    the frame arrived after a newer one was already tracked.
+
+    If timings is a dict, milliseconds spent per stage (convert, detect,
+    track, crop, embed, identify) are added to it.
+    """
+    t = time.perf_counter()
+    imgs = [Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame, _, _ in items]
+    t = _lap(timings, "convert", t)
+    all_boxes = detect_faces_batch(imgs, multi_face)
+    t = _lap(timings, "detect", t)
+
+    plans, crops, owners = [], [], []
+    for i, ((_, tracker, seq), boxes) in enumerate(zip(items, all_boxes)):
+        if tracker is None:
+            tracks, todo = None, list(range(len(boxes)))
         else:
-            debug_text = f"{predicted_name} (d={dist:.2f}, c={conf:.2f})"
-            
-            recognized_name = predicted_name_raw 
-            color = (0, 255, 0)
+            update = tracker.update(boxes, seq)
+            if update is None:
+                plans.append(None)
+                continue
+            tracks, needs = update
+            todo = [j for j, need in enumerate(needs) if need]
+        plans.append((tracks, todo))
+        t = _lap(timings, "track", t)
+        if todo:
+            crops.append(load_models()[0].extract(imgs[i], boxes[todo], None))
+            owners.extend((i, j) for j in todo)
+        t = _lap(timings, "crop", t)
 
-        cv2.putText(frame, debug_text, (30, 60),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.85, color, 2)
+    identified = {}
+    if crops:
+        embs = embed_crops(crops)
+        t = _lap(timings, "embed", t)
+        identified = dict(zip(owners, zip(*identify(embs))))
+        t = _lap(timings, "identify", t)
 
-    else:
+    results = []
+    for i, plan in enumerate(plans):
+        if plan is None:
+            results.append(None)
+            continue
+        tracks, todo = plan
+        if tracks is None:
+            faces = [_face(all_boxes[i][j], *identified[(i, j)]) for j in todo]
+        else:
+            tracker = items[i][1]
+            for j in todo:
+                name_raw, dist, conf = identified[(i, j)]
+                label = name_raw if _is_known(name_raw, dist, conf) else None
+                tracker.record(tracks[j], label, float(dist), float(conf))
+            faces = [_track_face(track) for track in tracks]
+        results.append({"faces": faces, "names": [f["name"] for f in faces if f["name"]]})
+    return results
+
+
+def recognize_faces(frame, multi_face=MULTI_FACE):
+    """Detect, embed and identify every face in a BGR frame."""
+    return analyze_frames([(frame, None, None)], multi_face)[0]["faces"]
+
+
+def recognize_tracked(frame, tracker, seq=None, multi_face=MULTI_FACE):
+    """Tracked recognition of one frame; None when the frame is stale."""
+    result = analyze_frames([(frame, tracker, seq)], multi_face)[0]
+    return None if result is None else result["faces"]
+
+
+# Analyse a frame without drawing on it, so the result can be overlaid
+# on any later frame of the same stream
+def analyze_frame(frame, multi_face=MULTI_FACE, tracker=None, seq=None):
+    return analyze_frames([(frame, tracker, seq)], multi_face)[0]
+
+
+def draw_result(frame, result):
+    if not result["faces"]:
         cv2.putText(frame, "No face detected", (30, 60),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.85, (0, 0, 255), 2)
+        return frame
+
+    for face in result["faces"]:
+        x1, y1, x2, y2 = face["box"]
+        cv2.rectangle(frame, (x1, y1), (x2, y2), face["color"], 2)
+        cv2.putText(frame, face["text"], (x1, max(y1 - 10, 20)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, face["color"], 2)
+    return frame
 
-    return frame, recognized_name
\ No newline at end of file
+
+# FUNCTION CALLED FROM FLASK /video_feed
+def recognize_frame(frame):
+    result = analyze_frame(frame)
+    name = result["names"][0] if result["names"] else None
+    return draw_result(frame, result), name
@@ -0,0 +1,71 @@
+# reports.py
+# Aggregate attendance queries shared by the dashboard, the monthly page
+# and the live counter. Everything is one GROUP BY over a date range
+# instead of a COUNT per day.
+import calendar
+from datetime import date, timedelta
+
+from models import db, Attendance
+
+
+def month_bounds(year, month):
+    """First and last date of a month."""
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def daily_status_counts(start, end):
+    """
+    Present/absent counts per day between start and end (inclusive).
+    Returns {date: {"present": n, "absent": n}}; days without records are omitted.
+    """
+    rows = (
+        db.session.query(Attendance.date, Attendance.status, db.func.count(Attendance.id))
+        .filter(Attendance.date.between(start, end))
+        .group_by(Attendance.date, Attendance.status)
+        .all()
+    )
+
+    summary = {}
+    for day, status, count in rows:
+        counts = summary.setdefault(day, {"present": 0, "absent": 0})
+        if status == "Present":
+            counts["present"] += count
+        elif status == "Absent":
+            counts["absent"] += count
+    return summary
+
+
+def status_counts(day):
+    """Present/absent counts for a single day."""
+    return daily_status_counts(day, day).get(day, {"present": 0, "absent": 0})
+
+
+def student_status_counts(start, end):
+    """
+    Present/absent counts per student between start and end (inclusive).
+    Returns {student_id: {"present": n, "absent": n}}; students without records are omitted.
+    """
+    rows = (
+        db.session.query(Attendance.student_id, Attendance.status, db.func.count(Attendance.id))
+        .filter(Attendance.date.between(start, end))
+        .group_by(Attendance.student_id, Attendance.status)
+        .all()
+    )
+
+    summary = {}
+    for student_id, status, count in rows:
+        counts = summary.setdefault(student_id, {"present": 0, "absent": 0})
+        if status == "Present":
+            counts["present"] += count
+        elif status == "Absent":
+            counts["absent"] += count
+    return summary
+
+
+def weekday_count(start, end):
+    """School days (Monday to Friday) between start and end (inclusive)."""
+    days = (end - start).days + 1
+    if days <= 0:
+        return 0
+    full_weeks, extra = divmod(days, 7)
+    return full_weeks * 5 + sum(1 for i in range(extra) if (start + timedelta(days=i)).weekday() < 5)
@@ -1,42 +1,16 @@
-import os
-import torch
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.decomposition import PCA
-from sklearn.preprocessing import normalize
 from collections import defaultdict
 import matplotlib.colors as mcolors
 import matplotlib.cm as cm
+from embedding_store import EmbeddingStore, EMBEDDING_DIR
 
 # -----------------------------
-# Paths
+# Load embeddings (memory-mapped, already L2-normalized)
 # -----------------------------
-EMBEDDING_DIR = r"C:\Users\HP\OneDrive\cvproject\embeddings"
-
-# -----------------------------
-# Load embeddings
-# -----------------------------
-X = []
-labels = []
-
-for file in os.listdir(EMBEDDING_DIR):
-    if file.endswith(".pt"):
-        path = os.path.join(EMBEDDING_DIR, file)
-
-        emb = torch.load(path)
-        if isinstance(emb, torch.Tensor):
-            emb = emb.detach().cpu().numpy().flatten()
-        else:
-            emb = emb.flatten()
-
-        name = file.split("_")[0]  # full_name
-        X.append(emb)
-        labels.append(name)
-
-X = np.array(X)
-
-# Normalize (important)
-X = normalize(X, norm="l2")
+X, meta = EmbeddingStore(EMBEDDING_DIR).load()
+labels = [m["label"] for m in meta]
 
 print("Total embeddings:", len(X))
 
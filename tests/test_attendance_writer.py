@@ -0,0 +1,57 @@
+# tests/test_attendance_writer.py
+# flush() must make every submitted sighting durable before it returns,
+# including a batch the flusher thread is still collecting.
+import os
+import sys
+import time
+from datetime import date, datetime
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, Student, Attendance
+from attendance_writer import AttendanceWriter
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + str(tmp_path / "attendance.db")
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        student = Student(full_name="A One", roll_no="1", image_folder="x")
+        db.session.add(student)
+        db.session.flush()
+        db.session.add(Attendance(student_id=student.id, date=date.today(), day_of_week="Monday",
+                                  status="Absent", timestamp=datetime.now(), source="system"))
+        db.session.commit()
+    return app
+
+
+def status_of(app, student_id):
+    with app.app_context():
+        return db.session.execute(
+            db.select(Attendance.status).where(Attendance.student_id == student_id)
+        ).scalar_one()
+
+
+def test_flush_writes_batch_held_by_flusher(app):
+    # A long interval so the flusher would otherwise sit on the event
+    writer = AttendanceWriter(app, flush_interval_ms=10_000)
+    try:
+        writer.submit(1)
+        time.sleep(0.1)        # let the flusher take the event off the queue
+        assert writer.flush()
+        assert status_of(app, 1) == "Present"
+    finally:
+        writer.stop()
+
+
+def test_flush_without_flusher_thread(app):
+    writer = AttendanceWriter(app)
+    writer.submit(1)
+    writer.stop()
+    assert status_of(app, 1) == "Present"
@@ -0,0 +1,15 @@
+# tests/test_startup.py
+# Importing the app must stay cheap: torch and the face models load on the
+# first stream or an explicit warm-up, never at import.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from measure_startup import measure_once
+
+
+def test_importing_app_does_not_load_torch():
+    result = measure_once(warm=False)
+    assert not result["torch_imported"]
+    assert not result["sklearn_imported"]
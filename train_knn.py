@@ -1,58 +1,14 @@
 # train_knn.py
-import os
-import torch
-import numpy as np
-from sklearn.preprocessing import LabelEncoder, normalize
-from sklearn.neighbors import KNeighborsClassifier
-import joblib
+# Builds the embedding index used by recognize_knn_attendance.py.
+# The running server does the same through the job queue (/jobs/retrain).
+from embedding_index import INDEX_PATH
+from embedding_store import EmbeddingStore, EMBEDDING_DIR
+from enrollment import rebuild_index
 
-EMBEDDING_DIR = r"C:\Users\HP\OneDrive\cvproject\embeddings"
-MODEL_PATH = r"C:\Users\HP\OneDrive\cvproject\knn_model.joblib"
-LABEL_PATH = r"C:\Users\HP\OneDrive\cvproject\label_encoder.joblib"
+# Memory-mapped load: one file, no per-embedding unpickling
+index = rebuild_index(EmbeddingStore(EMBEDDING_DIR), INDEX_PATH)
 
-X = []
-y = []
+print("Loaded embeddings:", len(index))
 
-# Load all .pt embeddings
-for file in os.listdir(EMBEDDING_DIR):
-    if file.endswith(".pt"):
-
-        path = os.path.join(EMBEDDING_DIR, file)
-        vec = torch.load(path)
-        if isinstance(vec, torch.Tensor):
-            vec = vec.detach().cpu().numpy().flatten()
-        else:
-            vec = vec.flatten()
-
-        # -------------------------------------------------
-        # FIX: Correctly extract FULL NAME from file name
-        # Example: "divy_tank_1.pt" → "divy tank"
-        # -------------------------------------------------
-        parts = file.split("_")[:-1]  # remove last item (index)
-        student_name = " ".join(parts)
-
-        X.append(vec)
-        y.append(student_name.lower())
-
-print("Loaded embeddings:", len(X))
-
-X = np.array(X)
-y = np.array(y)
-
-# Normalize embeddings
-X = normalize(X, norm="l2")
-
-# Encode labels
-le = LabelEncoder()
-y_enc = le.fit_transform(y)
-
-# Train k-NN (cosine)
-knn = KNeighborsClassifier(n_neighbors=3, metric="cosine")
-knn.fit(X, y_enc)
-
-# Save model + label encoder
-joblib.dump(knn, MODEL_PATH)
-joblib.dump(le, LABEL_PATH)
-
-print("🎉 KNN model saved as:", MODEL_PATH)
-print("🎉 Label encoder saved as:", LABEL_PATH)
+print("🎉 Embedding index saved as:", INDEX_PATH)
+print("   Students:", len(index.classes))
@@ -1,19 +1,95 @@
+# upgrade_db.py
+# Versioned schema migrations for attendance.db. The app applies them at
+# startup to the database it is configured for (ATTENDANCE_DATABASE_URI).
+# The applied version is stored in SQLite's PRAGMA user_version, so every
+# migration runs exactly once and re-running this script is harmless.
+#
+# Run: python upgrade_db.py [path/to/attendance.db]
+import os
+import sys
 import sqlite3
 
-conn = sqlite3.connect("attendance.db")
-cur = conn.cursor()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, "attendance.db")
 
-try:
-    cur.execute("ALTER TABLE student ADD COLUMN mobile TEXT;")
-except:
-    print("Column 'mobile' already exists.")
 
-try:
-    cur.execute("ALTER TABLE student ADD COLUMN email TEXT;")
-except:
-    print("Column 'email' already exists.")
+def _columns(cur, table):
+    return {row[1] for row in cur.execute(f"PRAGMA table_info({table})")}
 
-conn.commit()
-conn.close()
 
-print("Database upgraded successfully.")
+# ---------------- MIGRATIONS ----------------
+def m001_student_contact_columns(cur):
+    cols = _columns(cur, "student")
+    if "mobile" not in cols:
+        cur.execute("ALTER TABLE student ADD COLUMN mobile TEXT")
+    if "email" not in cols:
+        cur.execute("ALTER TABLE student ADD COLUMN email TEXT")
+
+
+def m002_attendance_indexes(cur):
+    # Keep one row per (student_id, date) before the unique index goes on:
+    # prefer Present, then the latest timestamp.
+    cur.execute("""
+        DELETE FROM attendance WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY student_id, date
+                    ORDER BY status = 'Present' DESC, timestamp DESC, id DESC
+                ) AS rn
+                FROM attendance
+            ) WHERE rn > 1
+        )
+    """)
+    if cur.rowcount > 0:
+        print(f"Removed {cur.rowcount} duplicate attendance rows.")
+
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_attendance_student_date ON attendance (student_id, date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_attendance_date_status ON attendance (date, status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_student_full_name_lower ON student (lower(full_name))")
+    cur.execute("ANALYZE")
+
+
+MIGRATIONS = [
+    m001_student_contact_columns,
+    m002_attendance_indexes,
+]
+
+
+def migrate(conn):
+    """Apply every migration newer than the database's user_version."""
+    cur = conn.cursor()
+    version = cur.execute("PRAGMA user_version").fetchone()[0]
+
+    for number, migration in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        migration(cur)
+        # PRAGMA cannot be parameterised
+        cur.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
+        print(f"Applied migration {number}: {migration.__name__}")
+
+    return len(MIGRATIONS)
+
+
+def upgrade_engine(engine):
+    """Apply the migrations through a SQLAlchemy engine (whatever database the app is configured for)."""
+    conn = engine.raw_connection()
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
+
+
+def upgrade(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    try:
+        version = migrate(conn)
+    finally:
+        conn.close()
+    return version
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    print(f"Database upgraded successfully (schema version {upgrade(path)}).")